@@ -4,36 +4,41 @@ import numpy as np
 
 from deap import gp #  gp.PrimitiveSet, gp.genHalfAndHalf, gp.PrimitiveTree, gp.genFull, gp.from_string
 
-import evaluate # find_worst_raw_error_vector
 
 
 class CodeItem (ctypes.Structure):
     _fields_ = [("_type", ctypes.c_int), ("_value", ctypes.c_int), ("_arity", ctypes.c_int)]
 
 
-def compile_deap(deap_code, symbol_table, get_item_value):
-    c_code = (CodeItem * len(deap_code))()
-    ITEM_INT = 1
-    ITEM_FCALL = 2
-    ITEM_VAR = 3
-    fcall_index = {
-        'lt':(1,2), 'le':(2,2), 'ge':(3,2), 'gt':(4,2), 'add':(5,2), 'sub':(6,2), 'mul':(7,2), 'div':(8,2),
-        'eq':(9,2), 'ne':(10,2), 'and':(11,2), 'or':(12,2), 'not':(13,1),
-        'first':(14,1), 'rest':(15,1), 'extend':(16,2), 'append':(17,2), 'cons':(18,2), 'len':(19,1),
-        'at':(20,2), 'at2':(20,2), 'at3':(20,3), 
-        'list':(21,2), 'list1':(21,1), 'list2':(21,2), 'list3':(21,3), 
-        'last':(22,2), 'last2':(22,2), 'last3':(22,3), 
-        'var':(23,3), 'assign':(24,2),
-        'function':(25,4), # 4: func_id, n_params, n_locals, code
-        'if':(26,2), 'if_then_else':(26,3),
-        'for':(27,3),
-        'print':(28,1),
-        'assert':(29,1),
-        'exit':(30,0),
-        'sum':(31,1),
-    }
-    # "compile" deap code into array of c structs
-    for i, item in enumerate(deap_code):
+# same memory layout as CodeItem, for output buffers that C++ writes into directly
+code_item_dtype = np.dtype([("_type", np.int32), ("_value", np.int32), ("_arity", np.int32)])
+assert code_item_dtype.itemsize == ctypes.sizeof(CodeItem)
+
+
+ITEM_INT = 1
+ITEM_FCALL = 2
+ITEM_VAR = 3
+fcall_index = {
+    'lt':(1,2), 'le':(2,2), 'ge':(3,2), 'gt':(4,2), 'add':(5,2), 'sub':(6,2), 'mul':(7,2), 'div':(8,2),
+    'eq':(9,2), 'ne':(10,2), 'and':(11,2), 'or':(12,2), 'not':(13,1),
+    'first':(14,1), 'rest':(15,1), 'extend':(16,2), 'append':(17,2), 'cons':(18,2), 'len':(19,1),
+    'at':(20,2), 'at2':(20,2), 'at3':(20,3), 
+    'list':(21,2), 'list1':(21,1), 'list2':(21,2), 'list3':(21,3), 
+    'last':(22,2), 'last2':(22,2), 'last3':(22,3), 
+    'var':(23,3), 'assign':(24,2),
+    'function':(25,4), # 4: func_id, n_params, n_locals, code
+    'if':(26,2), 'if_then_else':(26,3),
+    'for':(27,3),
+    'print':(28,1),
+    'assert':(29,1),
+    'exit':(30,0),
+    'sum':(31,1),
+}
+
+
+def compile_deap_impl(c_code, offset, deap_code, symbol_table, get_item_value):
+    # "compile" deap code into array of c structs, starting at c_code[offset]
+    for i, item in enumerate(deap_code, offset):
         item = get_item_value(item)
         if type(item) == type(""):
             if item in fcall_index:
@@ -52,9 +57,69 @@ def compile_deap(deap_code, symbol_table, get_item_value):
             assert type(item) == type(1)
             c_code[i]._type = ITEM_INT
             c_code[i]._value, c_code[i]._arity = item, 0
+
+
+def compile_deap(deap_code, symbol_table, get_item_value):
+    c_code = (CodeItem * len(deap_code))()
+    compile_deap_impl(c_code, 0, deap_code, symbol_table, get_item_value)
     return c_code
+
+
+def compile_deap_batch(deap_codes, symbol_table, get_item_value):
+    c_code_sizes = (ctypes.c_int * len(deap_codes))()
+    for i, deap_code in enumerate(deap_codes):
+        c_code_sizes[i] = len(deap_code)
+    c_codes = (CodeItem * sum(c_code_sizes))()
+    offset = 0
+    for deap_code in deap_codes:
+        compile_deap_impl(c_codes, offset, deap_code, symbol_table, get_item_value)
+        offset += len(deap_code)
+    return c_code_sizes, c_codes
     
 
+def compile_deap_to_array(deap_code, symbol_table, get_item_value):
+    '''Same as compile_deap, as an int32 array of shape (len(deap_code), 3) : the _type, _value, _arity per item'''
+    return np.frombuffer(compile_deap(deap_code, symbol_table, get_item_value), dtype=np.int32).reshape(-1, 3)
+
+
+def get_code(cpp_handle, ind):
+    '''The compiled code of gp.PrimitiveTree ind, compiled once and kept in ind.code.  Code arrays are never changed
+    in place, so children can share (slices of) the code of their parents, see ga_search_tools.replace_subtree'''
+    code = getattr(ind, "code", None)
+    if code is None:
+        code = compile_deap_to_array(ind, cpp_handle[2], get_deap_item_value)
+        ind.code = code
+    assert len(code) == len(ind)
+    return code
+
+
+def as_c_code(code):
+    '''CodeItem array on the memory of an int32 code array, without copying when possible'''
+    code = np.require(code, dtype=np.int32, requirements=["C", "W"])
+    return (CodeItem * len(code)).from_buffer(code)
+
+
+def get_c_codes(cpp_handle, deap_codes, get_item_value):
+    '''Returns c_code_sizes, c_codes as compile_deap_batch.  Without get_item_value, deap_codes are gp.PrimitiveTrees
+    and their cached code is used'''
+    if get_item_value is not None:
+        return compile_deap_batch(deap_codes, cpp_handle[2], get_item_value)
+    codes = [get_code(cpp_handle, deap_code) for deap_code in deap_codes]
+    c_code_sizes = (ctypes.c_int * len(codes))(*[len(code) for code in codes])
+    c_codes = as_c_code(np.concatenate(codes) if len(codes) > 0 else np.empty((0, 3), dtype=np.int32))
+    return c_code_sizes, c_codes
+
+
+def get_deap_item_value(item):
+    '''get_item_value for deap code given as a gp.PrimitiveTree'''
+    return item.name if isinstance(item, gp.Primitive) else item.value
+
+
+def get_pp_str_item_value(item):
+    '''get_item_value for deap code given as the items of a pp_str, see ga_search_tools.make_pp_str'''
+    return int(item) if item.lstrip("-").isdigit() else item
+
+
 def create_symbol_table(param_names, local_variable_names):
     symbol_table = dict()
     for symbol in param_names + local_variable_names:
@@ -107,6 +172,33 @@ def compile_inputs(inputs):
     return result
 
 
+def compile_inputs_for_batch(inputs):
+    n_params = len(inputs[0]) if len(inputs) > 0 else 0
+    c_param_sizes = (ctypes.c_int * (len(inputs) * n_params))()
+    params_data_in_prefix_notation = []
+    for i, params in enumerate(inputs):
+        assert len(params) == n_params
+        for j, param in enumerate(params):
+            param_data_in_prefix_notation = convert_data_to_prefix_notation(param)
+            c_param_sizes[i * n_params + j] = len(param_data_in_prefix_notation)
+            params_data_in_prefix_notation.extend(param_data_in_prefix_notation)
+    c_params = convert_data_in_prefix_notation_to_c(params_data_in_prefix_notation)
+    return n_params, c_param_sizes, c_params
+
+
+def compile_expected_outputs_for_batch(c_expected_outputs):
+    sizes, c_outputs = c_expected_outputs
+    c_sizes = (ctypes.c_int * len(sizes))()
+    c_data = (ctypes.c_int * sum(sizes))()
+    offset = 0
+    for i, (n, c_output) in enumerate(zip(sizes, c_outputs)):
+        c_sizes[i] = n
+        for j in range(n):
+            c_data[offset + j] = c_output[j]
+        offset += n
+    return c_sizes, c_data
+
+
 def compile_expected_outputs(expected_outputs):
     sizes, c_outputs = [], []
     for data in expected_outputs:        
@@ -139,17 +231,17 @@ def load_cpp_lib():
 
 
 def create_ouput_bufs(n):
+    '''One contiguous array, output_bufs[i] is the output buffer of input i'''
     output_bufsize = 1000
-    output_bufs = []
-    for i in range(n):
-        output_bufs.append((CodeItem * output_bufsize)())
+    output_bufs = np.zeros((n, output_bufsize), dtype=code_item_dtype)
     return output_bufs, output_bufsize
 
 
 global g_max_depth
 g_max_depth = 0
 
-def convert_c_output_to_python_impl(output_buf, n_output, sp, depth):
+def convert_c_output_to_python_impl(items, n_output, sp, depth):
+    # items[i] is the tuple (_type, _value, _arity)
     global g_max_depth
     if g_max_depth < depth:
         g_max_depth = depth
@@ -158,20 +250,20 @@ def convert_c_output_to_python_impl(output_buf, n_output, sp, depth):
         return None, sp
     ITEM_INT = 1
     ITEM_LIST = 4
-    if output_buf[sp]._type == ITEM_INT:
-        result = int(output_buf[sp]._value)
+    if items[sp][0] == ITEM_INT:
+        result = items[sp][1]
         sp += 1
     else:
-        assert output_buf[sp]._type == ITEM_LIST
-        arity = output_buf[sp]._arity
+        assert items[sp][0] == ITEM_LIST
+        arity = items[sp][2]
         result = []
         sp += 1
         for _ in range(arity):
-            if output_buf[sp]._type == ITEM_INT:
-                result.append(int(output_buf[sp]._value))
+            if items[sp][0] == ITEM_INT:
+                result.append(items[sp][1])
                 sp += 1
             else:
-                subtree, sp_out = convert_c_output_to_python_impl(output_buf, n_output, sp, depth+1)
+                subtree, sp_out = convert_c_output_to_python_impl(items, n_output, sp, depth+1)
                 assert sp_out > sp
                 assert type(subtree) == type(1) or sp_out >= sp + len(subtree)
                 sp = sp_out
@@ -182,28 +274,47 @@ def convert_c_output_to_python_impl(output_buf, n_output, sp, depth):
     return result, sp
 
 
+def as_code_item_array(output_buf):
+    '''View on a ctypes CodeItem array as a code_item_dtype array, without copying'''
+    if isinstance(output_buf, np.ndarray):
+        return output_buf
+    return np.ctypeslib.as_array(output_buf).view(code_item_dtype)
+
+
 def convert_c_output_to_python(output_buf, n_output):
     if n_output == 0:
         result = 0
     else:
         sp = 0
-        result, sp = convert_c_output_to_python_impl(output_buf, n_output, sp, 0)
+        items = as_code_item_array(output_buf)[:n_output].tolist()
+        result, sp = convert_c_output_to_python_impl(items, n_output, sp, 0)
         assert sp == n_output
     #print("convert_c_output_to_python result", result)
     return result 
 
 
 def convert_c_output_to_pp_str(output_buf, n_output):
-    result = ""
     # ITEM_INT = 1
     # ITEM_LIST = 4
-    #for i in range(n_output):
-    #    item = output_buf[i]
-    for item in output_buf[:n_output]:
-        if item._type == 1:
-            result += f" {item._value}"
-        else:
-            result += f" L{item._arity}"
+    items = as_code_item_array(output_buf)[:n_output].tolist()
+    return "".join([f" {value}" if _type == 1 else f" L{arity}" for _type, value, arity in items])
+
+
+def compute_output_fingerprints(output_bufs, n_outputs):
+    '''Fingerprint of each output output_bufs[i][:n_outputs[i]], computed on the buffers for all outputs at once.
+    Equal to the output fingerprints of compute_error_matrices, see compute_output_fingerprint in C++'''
+    fnv_prime = np.uint64(1099511628211)
+    result = np.full(len(n_outputs), 14695981039346656037, dtype=np.uint64)
+    n_outputs = np.asarray(n_outputs)
+    for sp in range(int(np.max(n_outputs)) if len(n_outputs) > 0 else 0):
+        items = output_bufs[:, sp]
+        x = np.where(items["_type"] == ITEM_INT, items["_value"], items["_arity"]).astype(np.uint32).astype(np.uint64)
+        h = result ^ (items["_type"].astype(np.uint64) & np.uint64(0xff))
+        h *= fnv_prime
+        for k in range(4):
+            h ^= (x >> np.uint64(8 * k)) & np.uint64(0xff)
+            h *= fnv_prime
+        result = np.where(sp < n_outputs, h, result)
     return result
 
 
@@ -213,7 +324,8 @@ def call_cpp_interpreter(lib, c_n_params, c_param_sizes, c_params, n_local_varia
         c_n_params, ctypes.byref(c_param_sizes), ctypes.byref(c_params), \
         ctypes.c_int(n_local_variables), \
         ctypes.byref(c_code), ctypes.c_int(len(c_code)), \
-        ctypes.c_int(output_bufsize), ctypes.byref(output_buf), ctypes.byref(n_output), ctypes.c_int(debug))
+        ctypes.c_int(output_bufsize), output_buf.ctypes.data_as(ctypes.POINTER(CodeItem)), ctypes.byref(n_output), \
+        ctypes.c_int(debug))
 
 
 def call_cpp_evaluator(lib, expected_output_size, c_expected_output, c_actual_output_size, c_actual_output, error_vector_size, c_error_vector, debug):
@@ -225,12 +337,47 @@ def call_cpp_evaluator(lib, expected_output_size, c_expected_output, c_actual_ou
         ctypes.c_int(debug))
 
 
+def call_cpp_batch_evaluator(lib, c_code_sizes, c_codes, n_inputs, n_params, c_param_sizes, c_params, n_local_variables, \
+        c_expected_output_sizes, c_expected_outputs, penalise_non_reacting_models, raw_error_matrices, output_fingerprints, family_keys, \
+        debug):
+    '''In a separate python function to get exact timings on the C++ part via cProfile'''
+    lib.compute_error_matrices( \
+        ctypes.c_int(len(c_code_sizes)), ctypes.byref(c_code_sizes), ctypes.byref(c_codes), \
+        ctypes.c_int(n_inputs), ctypes.c_int(n_params), ctypes.byref(c_param_sizes), ctypes.byref(c_params), \
+        ctypes.c_int(n_local_variables), \
+        ctypes.byref(c_expected_output_sizes), ctypes.byref(c_expected_outputs), \
+        ctypes.c_int(1 if penalise_non_reacting_models else 0), \
+        raw_error_matrices.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), \
+        output_fingerprints.ctypes.data_as(ctypes.POINTER(ctypes.c_uint64)), \
+        family_keys.ctypes.data_as(ctypes.POINTER(ctypes.c_uint64)), \
+        ctypes.c_int(debug))
+
+
+def call_cpp_splice_evaluator(lib, c_parent_sizes, c_parents, c_splices, n_inputs, n_params, c_param_sizes, c_params, n_local_variables, \
+        c_expected_output_sizes, c_expected_outputs, penalise_non_reacting_models, raw_error_matrices, output_fingerprints, family_keys, \
+        debug):
+    '''In a separate python function to get exact timings on the C++ part via cProfile'''
+    lib.compute_error_matrices_of_splices( \
+        ctypes.c_int(c_parent_sizes[0]), ctypes.byref(c_parents), \
+        ctypes.c_int(c_parent_sizes[1]), ctypes.byref(c_parents, c_parent_sizes[0] * ctypes.sizeof(CodeItem)), \
+        ctypes.c_int(len(c_splices) // 2), ctypes.byref(c_splices), \
+        ctypes.c_int(n_inputs), ctypes.c_int(n_params), ctypes.byref(c_param_sizes), ctypes.byref(c_params), \
+        ctypes.c_int(n_local_variables), \
+        ctypes.byref(c_expected_output_sizes), ctypes.byref(c_expected_outputs), \
+        ctypes.c_int(1 if penalise_non_reacting_models else 0), \
+        raw_error_matrices.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), \
+        output_fingerprints.ctypes.data_as(ctypes.POINTER(ctypes.c_uint64)), \
+        family_keys.ctypes.data_as(ctypes.POINTER(ctypes.c_uint64)), \
+        ctypes.c_int(debug))
+
+
 def run_once(lib, c_param_sizes, c_params, n_local_variables, c_code, output_bufsize, output_buf, debug):
+    '''Runs on one input, the output is written in output_buf.  Returns its size'''
     c_n_params = ctypes.c_int(len(c_param_sizes))
     n_output = ctypes.c_int()
     n_output.value = 0
     call_cpp_interpreter(lib, c_n_params, c_param_sizes, c_params, n_local_variables, c_code, output_bufsize, output_buf, n_output, debug)
-    return convert_c_output_to_python(output_buf, n_output.value)
+    return n_output.value
 
 
 # ======================================== interface ================================================
@@ -244,66 +391,128 @@ def get_cpp_handle(inputs, param_names, local_variable_names, expected_outputs):
     output_bufs, output_bufsize = create_ouput_bufs(len(inputs))
     c_expected_outputs = compile_expected_outputs(expected_outputs)
     c_error_vector = (ctypes.c_double * 8)()
-    cpp_handle = lib, c_inputs, symbol_table, n_local_variables, output_bufsize, output_bufs, c_expected_outputs, c_error_vector
+    c_batch_inputs = compile_inputs_for_batch(inputs)
+    c_batch_expected_outputs = compile_expected_outputs_for_batch(c_expected_outputs)
+    cpp_handle = lib, c_inputs, symbol_table, n_local_variables, output_bufsize, output_bufs, c_expected_outputs, c_error_vector, \
+        c_batch_inputs, c_batch_expected_outputs
     return cpp_handle
 
 
-def run_on_all_inputs(cpp_handle, deap_code, get_item_value=None, debug=0):
-    result = []
-    lib, c_inputs, symbol_table, n_local_variables, output_bufsize, output_bufs, _, _ = cpp_handle
+def run_on_all_inputs_raw(cpp_handle, deap_code, get_item_value=None, debug=0):
+    '''Returns (output_bufs, n_outputs) : the output on input i is output_bufs[i][:n_outputs[i]].  output_bufs is the
+    buffer of the cpp_handle, which the next run overwrites'''
+    lib, c_inputs, symbol_table, n_local_variables, output_bufsize, output_bufs, _, _, _, _ = cpp_handle
     if get_item_value is None:
-        get_item_value = lambda x : x.name if isinstance(x, gp.Primitive) else x.value
-    c_code = compile_deap(deap_code, symbol_table, get_item_value)
-    for c_param_sizes, c_params in c_inputs:
-        result.append(run_once(lib, c_param_sizes, c_params, n_local_variables, c_code, output_bufsize, output_bufs[0], debug))
-    return result
+        c_code = as_c_code(get_code(cpp_handle, deap_code))
+    else:
+        c_code = compile_deap(deap_code, symbol_table, get_item_value)
+    n_outputs = np.empty(len(c_inputs), dtype=np.int64)
+    for i, (c_param_sizes, c_params) in enumerate(c_inputs):
+        n_outputs[i] = run_once(lib, c_param_sizes, c_params, n_local_variables, c_code, output_bufsize, output_bufs[i], debug)
+    return output_bufs, n_outputs
 
 
-def compute_error_matrix(cpp_handle, deap_code, penalise_non_reacting_models, families_dict, family_key_is_error_matrix=False):
-    assert type(penalise_non_reacting_models) == type(True)
-    get_item_value = None
-    debug = 0
-    lib, c_inputs, symbol_table, n_local_variables, output_bufsize, output_bufs, c_expected_outputs, c_error_vector = cpp_handle
-    raw_error_matrix = np.empty((len(c_inputs), 8))
-    model_output_cpp = []
-    if get_item_value is None:
-        get_item_value = lambda x : x.name if isinstance(x, gp.Primitive) else x.value
-    c_code = compile_deap(deap_code, symbol_table, get_item_value)
-    domain_output_set = set()
-    act_output_sizes = []
-    for row, (c_param_sizes, c_params) in enumerate(c_inputs):
-        c_n_params = ctypes.c_int(len(c_param_sizes))
-        n_output = ctypes.c_int()
-        n_output.value = 0
-        call_cpp_interpreter(lib, c_n_params, c_param_sizes, c_params, n_local_variables, c_code, output_bufsize, output_bufs[row], n_output, debug)
-        model_output_str = convert_c_output_to_pp_str(output_bufs[row], n_output.value)
-        act_output_sizes.append(n_output)
-        domain_output_set.add(model_output_str)
-        model_output_cpp.append(model_output_str)
-    if not family_key_is_error_matrix:
-        family_key = tuple(model_output_cpp)
-        if family_key in families_dict:
-            return None, family_key    
-        # A new family, evaluate the output
-
-    expected_output_sizes, expected_outputs = c_expected_outputs
-    for row, (exp_output_size, c_exp_output, c_act_output_size, c_act_output) in enumerate(zip(expected_output_sizes, expected_outputs, act_output_sizes, output_bufs)):
-        call_cpp_evaluator(lib, exp_output_size, c_exp_output, c_act_output_size, c_act_output, 8, c_error_vector, debug)
-        raw_error_matrix[row, ...] = c_error_vector
-    if penalise_non_reacting_models:
-        if len(domain_output_set) == 1:
-            worst_raw_error_vector = evaluate.find_worst_raw_error_vector(raw_error_matrix)
-            raw_error_matrix[:] = worst_raw_error_vector
+def run_on_all_inputs(cpp_handle, deap_code, get_item_value=None, debug=0):
+    output_bufs, n_outputs = run_on_all_inputs_raw(cpp_handle, deap_code, get_item_value, debug)
+    return [convert_c_output_to_python(output_buf, n_output) for output_buf, n_output in zip(output_bufs, n_outputs)]
+
+
+def select_family_key(raw_error_matrix, family_keys, family_key_is_error_matrix):
+    '''family_keys is the pair (fingerprint of all outputs, fingerprint of the error matrix) computed in C++'''
+    if family_key_is_error_matrix == 2:
+        return np.sum(tuple(raw_error_matrix.flatten()))
+    return int(family_keys[1] if family_key_is_error_matrix else family_keys[0])
+
+
+def check_family_key(cpp_handle, deap_code, raw_error_matrix, family_key, family_key_is_error_matrix, family_key_check_dict, get_item_value=None):
+    '''Debug mode : raises a RuntimeError when two different outputs (or error matrices) have the same fingerprint'''
+    if family_key_is_error_matrix == 2:
+        return # the sum of the error matrix is not a fingerprint
     if family_key_is_error_matrix:
-        family_key = tuple(raw_error_matrix.flatten())
-        if family_key_is_error_matrix == 2:
-            family_key = np.sum(family_key)
-        if family_key in families_dict:
-            return None, family_key    
+        full_key = tuple(raw_error_matrix.flatten())
+    else:
+        # the outputs themselves, as the bytes of their items, without conversion to python lists
+        output_bufs, n_outputs = run_on_all_inputs_raw(cpp_handle, deap_code, get_item_value)
+        full_key = tuple([output_buf[:n_output].tobytes() for output_buf, n_output in zip(output_bufs, n_outputs)])
+    if family_key_check_dict.setdefault(family_key, full_key) != full_key:
+        raise RuntimeError(f"family key collision on {family_key}: {family_key_check_dict[family_key]} and {full_key}")
+
 
+def compute_error_matrix(cpp_handle, deap_code, penalise_non_reacting_models, family_key_is_error_matrix=False, get_item_value=None):
+    raw_error_matrices, _, family_keys = compute_error_matrices(cpp_handle, [deap_code], penalise_non_reacting_models, get_item_value)
+    raw_error_matrix = raw_error_matrices[0]
+    family_key = select_family_key(raw_error_matrix, family_keys[0], family_key_is_error_matrix)
     return raw_error_matrix, family_key
 
 
+def compute_error_matrices(cpp_handle, deap_codes, penalise_non_reacting_models, get_item_value=None, debug=0):
+    '''Runs and evaluates a batch of individuals in one call to C++.
+    Returns the raw error matrices, shape (len(deap_codes), n_inputs, 8), the output fingerprints, shape (len(deap_codes), n_inputs),
+    and the family keys, shape (len(deap_codes), 2) : the fingerprint of all outputs and the fingerprint of the error matrix'''
+    assert type(penalise_non_reacting_models) == type(True)
+    lib, c_inputs, symbol_table, n_local_variables, _, _, _, _, c_batch_inputs, c_batch_expected_outputs = cpp_handle
+    n_params, c_param_sizes, c_params = c_batch_inputs
+    c_expected_output_sizes, c_expected_outputs = c_batch_expected_outputs
+    c_code_sizes, c_codes = get_c_codes(cpp_handle, deap_codes, get_item_value)
+    raw_error_matrices = np.empty((len(deap_codes), len(c_inputs), 8))
+    output_fingerprints = np.empty((len(deap_codes), len(c_inputs)), dtype=np.uint64)
+    family_keys = np.empty((len(deap_codes), 2), dtype=np.uint64)
+    if len(deap_codes) > 0:
+        call_cpp_batch_evaluator(lib, c_code_sizes, c_codes, len(c_inputs), n_params, c_param_sizes, c_params, n_local_variables, \
+            c_expected_output_sizes, c_expected_outputs, penalise_non_reacting_models, raw_error_matrices, output_fingerprints, \
+            family_keys, debug)
+    return raw_error_matrices, output_fingerprints, family_keys
+
+
+def compute_error_matrices_of_splices(cpp_handle, parent1, parent2, splices, penalise_non_reacting_models, debug=0):
+    '''Same as compute_error_matrices on the children, but the children are made in C++ : child s is parent1 with its
+    subtree at index splices[s][0] replaced by the subtree of parent2 at index splices[s][1]'''
+    assert type(penalise_non_reacting_models) == type(True)
+    lib, c_inputs, symbol_table, n_local_variables, _, _, _, _, c_batch_inputs, c_batch_expected_outputs = cpp_handle
+    n_params, c_param_sizes, c_params = c_batch_inputs
+    c_expected_output_sizes, c_expected_outputs = c_batch_expected_outputs
+    assert all(0 <= index1 < len(parent1) and 0 <= index2 < len(parent2) for index1, index2 in splices)
+    c_parent_sizes, c_parents = get_c_codes(cpp_handle, [parent1, parent2], None)
+    c_splices = (ctypes.c_int * (2 * len(splices)))(*[index for splice in splices for index in splice])
+    raw_error_matrices = np.empty((len(splices), len(c_inputs), 8))
+    output_fingerprints = np.empty((len(splices), len(c_inputs)), dtype=np.uint64)
+    family_keys = np.empty((len(splices), 2), dtype=np.uint64)
+    if len(splices) > 0:
+        call_cpp_splice_evaluator(lib, c_parent_sizes, c_parents, c_splices, len(c_inputs), n_params, c_param_sizes, c_params, \
+            n_local_variables, c_expected_output_sizes, c_expected_outputs, penalise_non_reacting_models, raw_error_matrices, \
+            output_fingerprints, family_keys, debug)
+    return raw_error_matrices, output_fingerprints, family_keys
+
+
+def set_subtree_value_cache_size(cpp_handle, max_size):
+    '''Size of the C++ LRU cache of subtree values, shared by all programs that are evaluated on the same inputs.  0 : off'''
+    lib = cpp_handle[0]
+    lib.set_subtree_value_cache_size(ctypes.c_int(max_size))
+
+
+def set_error_weights(cpp_handle, error_weights):
+    '''Exponents w1, w2a, w2b, w3, w4, w5, w6, w7, w8 of the error components, as evaluate.g_w1 ... evaluate.g_w8'''
+    assert len(error_weights) == 9
+    lib = cpp_handle[0]
+    c_weights = (ctypes.c_double * 9)(*error_weights)
+    lib.set_error_weights(ctypes.byref(c_weights))
+
+
+def set_native_evaluator(cpp_handle, native_evaluator):
+    '''Selects the C++ version of the error function, see evaluate.native_error_functions'''
+    lib = cpp_handle[0]
+    if lib.set_native_evaluator(ctypes.c_int(native_evaluator)) != 0:
+        raise RuntimeError(f"native evaluator {native_evaluator} is not implemented in C++")
+
+
+def get_subtree_value_cache_counters(cpp_handle):
+    '''Returns hits, misses and the number of cached values of the C++ subtree value cache of this process'''
+    lib = cpp_handle[0]
+    counters = (ctypes.c_uint64 * 3)()
+    lib.get_subtree_value_cache_counters(ctypes.byref(counters))
+    return tuple(counters)
+
+
 # ======================================== test ================================================
 
 
@@ -355,12 +564,19 @@ if __name__ == "__main__":
     c_code = compile_deap(deap_code, symbol_table, get_item_value=get_item_value)
 
     print("Testing get_cpp_handle")
-    cpp_handle = get_cpp_handle(inputs, param_names, local_variable_names)
+    expected_outputs = [[84], [85, 86], [86, 87, 89]]
+    cpp_handle = get_cpp_handle(inputs, param_names, local_variable_names, expected_outputs)
 
     print("Testing run_on_all_inputs")
     outputs = run_on_all_inputs(cpp_handle, deap_code, get_item_value=get_item_value)
     print("outputs", outputs)
-    assert outputs == [[84], [85, 86], [86, 87, 89]]
+    assert outputs == expected_outputs
+
+    print("Testing compute_output_fingerprints")
+    output_bufs, n_outputs = run_on_all_inputs_raw(cpp_handle, deap_code, get_item_value=get_item_value)
+    fingerprints = compute_output_fingerprints(output_bufs, n_outputs)
+    _, cpp_fingerprints, _ = compute_error_matrices(cpp_handle, [deap_code], False, get_item_value=get_item_value)
+    assert list(fingerprints) == list(cpp_fingerprints[0])
 
     print("Integration test OK")
 
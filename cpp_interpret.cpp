@@ -11,8 +11,10 @@ g++ -shared -fPIC -O2 -o cpp_interpret.so cpp_interpret.cpp
 #include <string>
 #include <map>
 #include <set>
+#include <unordered_map>
 #include <exception>
-#include <string.h> // strncmp
+#include <stdexcept> // runtime_error
+#include <string.h> // strncmp, memcpy
 #include <cassert>
 #include <cmath> // pow
 #include <algorithm> // sort
@@ -98,9 +100,60 @@ public:
 };
 
 
+struct SubtreeValue {
+public:
+    bool _valid; // false if the subtree was not run, or its run raised an exception
+    List _value;
+    int _size; // number of items of the subtree
+    int _count_runs_calls; // run_impl calls of the subtree, for the limit on g_count_runs_calls
+    int _height; // deepest run_impl call of the subtree, relative to the subtree, for the limit on the code depth
+};
+
+
+struct SubtreeCache {
+public:
+    // run_impl takes the values of the subtrees of _program from the recorded runs of the parents, see
+    // compute_error_matrices_of_splices.  Only valid for programs without side effects, see is_pure.
+    const Item* _program; // NULL : no caching
+    int _record_parent; // -1 : look up, 0 or 1 : record the values of the subtrees of _program in _values[_record_parent][input]
+    vector<vector<SubtreeValue>> _values[2]; // _values[parent][input][node]
+    vector<pair<int, int>> _lookup; // per item of _program : parent and node of the same subtree in the parent, parent -1 if none
+};
+
+
+struct CachedSubtree {
+public:
+    unsigned long long _key;
+    List _code;
+    int _input;
+    SubtreeValue _value;
+    int _prev, _next; // more and less recently used entry, -1 if none
+};
+
+
+struct SubtreeValueCache {
+public:
+    // LRU cache of the values of subtrees, over all programs that are run on the same inputs.  Only for subtrees
+    // without side effects that read no variable that the program changes : their value depends on the input only.
+    int _max_size; // 0 : no caching
+    vector<vector<List>> _input_variables; // the inputs of the cached values
+    vector<CachedSubtree> _entries;
+    int _first, _last; // most and least recently used entry, -1 if none
+    unordered_map<unsigned long long, int> _index; // key : entry
+    unsigned long long _hits, _misses;
+    const Item* _program; // NULL : no caching
+    vector<unsigned long long> _subtree_hashes; // per item of _program : structural hash of the subtree, 0 if not cached
+    vector<int> _subtree_sizes; // per item of _program
+};
+
+
 // =========================================== globals
 
 static int g_count_runs_calls = 0;
+static SubtreeCache g_subtree_cache = {NULL, -1, {}, {}};
+static SubtreeValueCache g_subtree_value_cache = {0, {}, {}, -1, -1, {}, 0, 0, NULL, {}, {}};
+static int g_input_index = 0; // the example input that is run, for the subtree caches
+static int g_max_depth = 0; // deepest run_impl call so far, for SubtreeValue._height
 
 
 // =========================================== Functions
@@ -455,6 +508,11 @@ void check_depth(const List& data, int current_depth) {
 
 List
 run_impl(int& sp, const Item* program, int program_size,
+         vector<List>& variables, vector<Function>& functions, bool debug, int depth);
+
+
+List
+run_impl_uncached(int& sp, const Item* program, int program_size,
          vector<List>& variables, vector<Function>& functions, bool debug, int depth
 ) {
     List result;
@@ -710,6 +768,61 @@ run_impl(int& sp, const Item* program, int program_size,
 }
 
 
+const SubtreeValue* find_subtree_value(const Item* program, int sp);
+void cache_subtree_value(const Item* program, int sp, const SubtreeValue& value);
+
+
+List
+run_impl(int& sp, const Item* program, int program_size,
+         vector<List>& variables, vector<Function>& functions, bool debug, int depth
+) {
+    SubtreeCache& cache = g_subtree_cache;
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    if (debug || (program != cache._program && program != value_cache._program)) {
+        return run_impl_uncached(sp, program, program_size, variables, functions, debug, depth);
+    }
+    const SubtreeValue* value = NULL;
+    if (program == cache._program && cache._record_parent < 0 && cache._lookup[sp].first >= 0) {
+        value = &cache._values[cache._lookup[sp].first][g_input_index][cache._lookup[sp].second];
+        if (!value->_valid) {
+            value = NULL;
+        }
+    }
+    bool use_value_cache = program == value_cache._program && value_cache._subtree_hashes[sp] != 0;
+    if (value == NULL && use_value_cache) {
+        value = find_subtree_value(program, sp);
+    }
+    if (value) {
+        // the same exceptions as running the subtree would give
+        if (depth + value->_height > 100) {
+            throw runtime_error("warning: code depth exceeded");
+        }
+        g_count_runs_calls += value->_count_runs_calls;
+        if (g_count_runs_calls > 10000) {
+            throw runtime_error("warning: code run calls exceeded");
+        }
+        g_max_depth = max(g_max_depth, depth + value->_height);
+        sp += value->_size;
+        return value->_value;
+    }
+    int start_sp = sp, start_count_runs_calls = g_count_runs_calls, max_depth = g_max_depth;
+    g_max_depth = depth;
+    List result = run_impl_uncached(sp, program, program_size, variables, functions, debug, depth);
+    bool record = program == cache._program && cache._record_parent >= 0;
+    if (record || use_value_cache) {
+        SubtreeValue computed = {true, result, sp - start_sp, g_count_runs_calls - start_count_runs_calls, g_max_depth - depth};
+        if (record) {
+            cache._values[cache._record_parent][g_input_index][start_sp] = computed;
+        }
+        if (use_value_cache) {
+            cache_subtree_value(program, start_sp, computed);
+        }
+    }
+    g_max_depth = max(max_depth, g_max_depth);
+    return result;
+}
+
+
 List assign(int& sp, const Item* program, int program_size,
          vector<List>& variables, vector<Function>& functions, bool debug, int depth
 ) {
@@ -976,15 +1089,16 @@ int _distance_with_closest_sorted_numbers(int x, const vector<int>& values) {
 }
 
 
-const double g_w1 = 0.3;
-const double g_w2a = 1.5;
-const double g_w2b = 1.1;
-const double g_w3 = 1.6;
-const double g_w4 = 1.5;
-const double g_w5 = 1.5;
-const double g_w6 = 0.1;
-const double g_w7 = 0.1;
-const double g_w8 = 0.4;
+// exponents of the error components, see set_error_weights
+double g_w1 = 0.3;
+double g_w2a = 1.5;
+double g_w2b = 1.1;
+double g_w3 = 1.6;
+double g_w4 = 1.5;
+double g_w5 = 1.5;
+double g_w6 = 0.1;
+double g_w7 = 0.1;
+double g_w8 = 0.4;
 
 void compute_error_vector_impl(
     int expected_output_size, int* expected_output,
@@ -1142,6 +1256,279 @@ void compute_error_vector_impl(
     error_vector[7] = error;
 }
 
+
+// The native evaluators below follow the compute_error_* functions of evaluate.py, see evaluate.native_error_functions
+// for the expected output they get.  They fill the first error components and set the others to 0.
+
+
+void compute_error_vector_wrapped_list_of_ints(
+    int expected_output_size, int* expected_output,
+    int actual_output_size, Item* actual_output,
+    int error_vector_size, double* error_vector,
+    int debug
+) {
+    // compute_error_list_of_ints([actual], [expect]), as compute_error_merge_elemb
+    List wrapped_output;
+    wrapped_output.push_back({ITEM_LIST, 0, 1});
+    wrapped_output.insert(wrapped_output.end(), actual_output, actual_output + actual_output_size);
+    compute_error_vector_impl(expected_output_size, expected_output, int(wrapped_output.size()), &wrapped_output[0],
+        error_vector_size, error_vector, debug);
+}
+
+
+void compute_error_vector_int(
+    int expected_output_size, int* expected_output,
+    int actual_output_size, Item* actual_output,
+    int error_vector_size, double* error_vector,
+    int debug
+) {
+    // compute_error_int, expected output : the int
+    Assert(expected_output_size == 1, "expected output must be an int");
+    for (int k = 0; k < error_vector_size; ++k) {
+        error_vector[k] = 0.0;
+    }
+    int actual = actual_output[0]._value;
+    if (actual_output[0]._type != ITEM_INT) {
+        error_vector[0] = 1.0;
+        vector<int> actual_numbers;
+        int sp = 0;
+        extract_numbers_list(actual_output_size, actual_output, sp, actual_numbers);
+        actual = actual_numbers[0]; // never empty, [] is extracted as '0'
+    }
+    error_vector[2] = pow(fabs(double(actual) - double(expected_output[0])), 1.2);
+}
+
+
+void compute_error_vector_exact(
+    int expected_output_size, int* expected_output,
+    int actual_output_size, Item* actual_output,
+    int error_vector_size, double* error_vector,
+    int debug
+) {
+    // compute_error_exact_*, expected output : the int
+    Assert(expected_output_size == 1, "expected output must be an int");
+    for (int k = 0; k < error_vector_size; ++k) {
+        error_vector[k] = 0.0;
+    }
+    bool is_expected = actual_output[0]._type == ITEM_INT && actual_output[0]._value == expected_output[0];
+    error_vector[0] = is_expected ? 0.0 : 1.0;
+}
+
+
+bool is_int(const Item* item, int value) {
+    return item->_type == ITEM_INT && item->_value == value;
+}
+
+
+void compute_error_vector_board_col_diag(
+    int expected_output_size, int* expected_output,
+    int actual_output_size, Item* actual_output,
+    int error_vector_size, double* error_vector,
+    int debug
+) {
+    // compute_error_board_col_diag_common, expected output : n, expect_cols, expect (n ints), board (n x n ints)
+    int n = expected_output[0];
+    int expect_cols = expected_output[1];
+    const int* expect = expected_output + 2;
+    const int* board = expected_output + 2 + n;
+    Assert(expected_output_size == 2 + n + n * n, "expected output size error");
+    for (int k = 0; k < error_vector_size; ++k) {
+        error_vector[k] = 0.0;
+    }
+    // an int output counts as a list with that int
+    vector<const Item*> actual;
+    if (actual_output[0]._type == ITEM_INT) {
+        actual.push_back(&actual_output[0]);
+    } else {
+        int sp = 1;
+        for (int k = 0; k < actual_output[0]._arity; ++k) {
+            actual.push_back(&actual_output[sp]);
+            skip_subtree(actual_output, sp);
+        }
+    }
+    int actual_size = int(actual.size());
+
+    // error : type difference
+    double error_type = actual_output[0]._type != ITEM_LIST ? 1.0 : 0.0;
+
+    // error : aantal outputs
+    double error_len = 0.0;
+    if (actual_size < n) {
+        error_len = pow(double(n - actual_size), 2.0);
+    } else if (actual_size > n) {
+        error_len = 0.1 * pow(double(actual_size - n), 1.2);
+    }
+
+    // error : zit er uit elke rij wat in
+    double error_fromrows = 0.0;
+    for (int row = 0; row < n; ++row) {
+        bool found = false;
+        for (int col = 0; col < n && !found; ++col) {
+            for (int k = 0; k < actual_size && !found; ++k) {
+                found = is_int(actual[k], board[row * n + col]);
+            }
+        }
+        if (!found) {
+            error_fromrows += 1;
+        }
+    }
+    error_fromrows = pow(error_fromrows, 2);
+
+    // error : is actual[row] een element van board[row]
+    double error_fromrows_ordered = 0.0;
+    for (int row = 0; row < n; ++row) {
+        if (row >= actual_size) {
+            error_fromrows_ordered += 3.0;
+        } else {
+            bool found = false;
+            for (int col = 0; col < n && !found; ++col) {
+                found = is_int(actual[row], board[row * n + col]);
+            }
+            if (!found) {
+                error_fromrows_ordered += 1.0;
+            }
+        }
+    }
+    error_fromrows_ordered = pow(error_fromrows_ordered, 2);
+
+    // error : aantal kolommen
+    vector<int> col_values(n, 0);
+    for (int k = 0; k < actual_size; ++k) {
+        bool found = false;
+        for (int row = 0; row < n && !found; ++row) {
+            for (int col = 0; col < n && !found; ++col) {
+                if (is_int(actual[k], board[row * n + col])) {
+                    col_values[col] = 1;
+                    found = true;
+                }
+            }
+        }
+    }
+    int actual_cols = 0;
+    for (int col = 0; col < n; ++col) {
+        actual_cols += col_values[col];
+    }
+    double error_columns = pow(double(abs(actual_cols - expect_cols)), 2);
+
+    // error :zijn het de juiste elementen uit de rows
+    double error_correct_elements_ordered = 0.0;
+    for (int row = 0; row < n; ++row) {
+        if (row >= actual_size) {
+            error_correct_elements_ordered += 3.0;
+        } else if (!is_int(actual[row], expect[row])) {
+            error_correct_elements_ordered += 1.0;
+        }
+    }
+    error_correct_elements_ordered = pow(error_correct_elements_ordered, 2);
+
+    const double w[] = {0.61, 0.06, 0.03, 0.09, 0.1, 0.11}; // default weights
+    error_vector[0] = error_type * w[0];
+    error_vector[1] = error_len * w[1];
+    error_vector[2] = error_fromrows * w[2];
+    error_vector[3] = error_fromrows_ordered * w[3];
+    error_vector[4] = error_columns * w[4];
+    error_vector[5] = error_correct_elements_ordered * w[5];
+}
+
+
+bool is_true(const Item* actual_output) {
+    // python bool() of the output
+    return actual_output[0]._type == ITEM_INT ? actual_output[0]._value != 0 : actual_output[0]._arity > 0;
+}
+
+
+void compute_error_vector_is_magic(
+    int expected_output_size, int* expected_output,
+    int actual_output_size, Item* actual_output,
+    int error_vector_size, double* error_vector,
+    int debug
+) {
+    // compute_error_is_magic, expected output : n, count_magic_rows, count_magic_cols, count_magic_diags
+    Assert(expected_output_size == 4, "expected output size error");
+    int n = expected_output[0];
+    int count_magic_rows = expected_output[1];
+    int count_magic_cols = expected_output[2];
+    int count_magic_diags = expected_output[3];
+    for (int k = 0; k < error_vector_size; ++k) {
+        error_vector[k] = 0.0;
+    }
+    double error = 0.0;
+    if (actual_output[0]._type != ITEM_INT) {
+        error += 0.64;
+    } else if (actual_output[0]._value != 0 && actual_output[0]._value != 1) {
+        error += 0.1;
+    }
+    if (is_true(actual_output)) {
+        error += 0.425 * (n - count_magic_rows) / n;
+        error += 0.325 * (n - count_magic_cols) / n;
+        error += 0.25 * (2 - count_magic_diags) / 2;
+    } else if (count_magic_rows == n && count_magic_cols == n && count_magic_diags == 2) {
+        error += 1.0;
+    }
+    error_vector[0] = error;
+}
+
+
+void compute_error_vector_is_sorted(
+    int expected_output_size, int* expected_output,
+    int actual_output_size, Item* actual_output,
+    int error_vector_size, double* error_vector,
+    int debug
+) {
+    // compute_error_is_sorted, expected output : len(data), count_out_of_order
+    Assert(expected_output_size == 2, "expected output size error");
+    int n = expected_output[0];
+    int count_out_of_order = expected_output[1];
+    for (int k = 0; k < error_vector_size; ++k) {
+        error_vector[k] = 0.0;
+    }
+    double error = 0.0;
+    if (actual_output[0]._type != ITEM_INT) {
+        error += 0.8;
+    } else if (actual_output[0]._value != 0 && actual_output[0]._value != 1) {
+        error += 0.2;
+    }
+    if (is_true(actual_output)) {
+        if (n >= 2) {
+            error += double(count_out_of_order) / (n - 1);
+        }
+    } else if (count_out_of_order == 0) {
+        error += 0.5;
+    }
+    error_vector[0] = error;
+}
+
+
+typedef void (*NativeEvaluator)(int, int*, int, Item*, int, double*, int);
+
+
+// index : evaluate.NATIVE_LIST_OF_INTS, evaluate.NATIVE_WRAPPED_LIST_OF_INTS, ...
+const NativeEvaluator g_native_evaluators[] = {
+    compute_error_vector_impl,
+    compute_error_vector_wrapped_list_of_ints,
+    compute_error_vector_int,
+    compute_error_vector_exact,
+    compute_error_vector_board_col_diag,
+    compute_error_vector_is_magic,
+    compute_error_vector_is_sorted,
+};
+const int g_n_native_evaluators = int(sizeof(g_native_evaluators) / sizeof(g_native_evaluators[0]));
+int g_native_evaluator = 0;
+
+
+extern "C"
+#if defined(_MSC_VER)
+__declspec(dllexport)
+#endif
+int set_native_evaluator(int native_evaluator) {
+    if (native_evaluator < 0 || native_evaluator >= g_n_native_evaluators) {
+        return 1;
+    }
+    g_native_evaluator = native_evaluator;
+    return 0;
+}
+
+
 extern "C"
 #if defined(_MSC_VER)
 __declspec(dllexport)
@@ -1156,7 +1543,7 @@ int compute_error_vector(
         printf("C++ compute_error_vector start\n");
     }
     Assert(error_vector_size == 8, "Expected error buffer of size 8");
-    compute_error_vector_impl(expected_output_size, expected_output, actual_output_size, actual_output,
+    g_native_evaluators[g_native_evaluator](expected_output_size, expected_output, actual_output_size, actual_output,
         error_vector_size, error_vector, debug);
     if (debug) {
         printf("    output ");
@@ -1167,3 +1554,476 @@ int compute_error_vector(
     }
     return 0;
 }
+
+extern "C"
+#if defined(_MSC_VER)
+__declspec(dllexport)
+#endif
+void set_error_weights(const double* weights) {
+    // w1, w2a, w2b, w3, w4, w5, w6, w7, w8, as evaluate.g_w1 ... evaluate.g_w8
+    g_w1 = weights[0];
+    g_w2a = weights[1];
+    g_w2b = weights[2];
+    g_w3 = weights[3];
+    g_w4 = weights[4];
+    g_w5 = weights[5];
+    g_w6 = weights[6];
+    g_w7 = weights[7];
+    g_w8 = weights[8];
+}
+
+
+// =========================================== batch interface
+
+
+const unsigned long long g_fnv_offset_basis = 14695981039346656037ULL;
+
+
+void fnv1a_update(unsigned long long& h, unsigned long long x, int n_bytes) {
+    for (int k = 0; k < n_bytes; ++k) {
+        h ^= (x >> (8 * k)) & 0xff;
+        h *= 1099511628211ULL;
+    }
+}
+
+
+unsigned long long compute_output_fingerprint(const List& output) {
+    // FNV-1a over the same fields as cpp_coupling.convert_c_output_to_pp_str: value of ints, arity of lists
+    unsigned long long h = g_fnv_offset_basis;
+    for (const Item& item : output) {
+        unsigned int x = (unsigned int)(item._type == ITEM_INT ? item._value : item._arity);
+        fnv1a_update(h, (unsigned long long)(item._type), 1);
+        fnv1a_update(h, (unsigned long long)(x), 4);
+    }
+    return h;
+}
+
+
+unsigned long long compute_error_matrix_fingerprint(const double* error_matrix, int n) {
+    // FNV-1a over the bits of the doubles; +0.0 maps -0.0 to 0.0, so that equal values give equal fingerprints
+    unsigned long long h = g_fnv_offset_basis;
+    for (int i = 0; i < n; ++i) {
+        double value = error_matrix[i] + 0.0;
+        unsigned long long x;
+        memcpy(&x, &value, sizeof(x));
+        fnv1a_update(h, x, 8);
+    }
+    return h;
+}
+
+
+bool is_same_output(const List& aa, const List& bb) {
+    // same notion of equality as comparing the strings of cpp_coupling.convert_c_output_to_pp_str
+    if (aa.size() != bb.size()) {
+        return false;
+    }
+    for (int i = 0; i < int(aa.size()); ++i) {
+        if (aa[i]._type != bb[i]._type) {
+            return false;
+        }
+        if (aa[i]._type == ITEM_INT ? aa[i]._value != bb[i]._value : aa[i]._arity != bb[i]._arity) {
+            return false;
+        }
+    }
+    return true;
+}
+
+
+double sum_error_vector(const double* error_vector) {
+    // same summation order as np.sum on 8 elements, so that the argmax agrees with evaluate.find_worst_raw_error_vector
+    const double* e = error_vector;
+    return ((e[0] + e[1]) + (e[2] + e[3])) + ((e[4] + e[5]) + (e[6] + e[7]));
+}
+
+
+bool is_pure(const Item* program, int begin, int end) {
+    // without side effects, a subtree gives the same value wherever it is in the program
+    for (int i = begin; i < end; ++i) {
+        if (program[i]._type == ITEM_FUSERCALL) {
+            return false;
+        }
+        if (program[i]._type == ITEM_FCALL) {
+            switch (program[i]._value) {
+                case F_VAR : case F_ASSIGN : case F_FOR : case F_FUNCTION : case F_PRINT : case F_ASSERT : case F_EXIT :
+                    return false;
+            }
+        }
+    }
+    return true;
+}
+
+
+void clear_subtree_value_cache() {
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    value_cache._entries.clear();
+    value_cache._index.clear();
+    value_cache._first = value_cache._last = -1;
+}
+
+
+void unlink_cached_subtree(int i) {
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    CachedSubtree& entry = value_cache._entries[i];
+    (entry._prev >= 0 ? value_cache._entries[entry._prev]._next : value_cache._first) = entry._next;
+    (entry._next >= 0 ? value_cache._entries[entry._next]._prev : value_cache._last) = entry._prev;
+}
+
+
+void link_cached_subtree_first(int i) {
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    CachedSubtree& entry = value_cache._entries[i];
+    entry._prev = -1;
+    entry._next = value_cache._first;
+    (value_cache._first >= 0 ? value_cache._entries[value_cache._first]._prev : value_cache._last) = i;
+    value_cache._first = i;
+}
+
+
+void check_subtree_value_cache_inputs(const vector<vector<List>>& input_variables) {
+    // the cached values are only valid for the inputs they are computed on
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    if (value_cache._input_variables != input_variables) {
+        clear_subtree_value_cache();
+        value_cache._input_variables = input_variables;
+    }
+}
+
+
+void prepare_subtree_value_cache(const Item* program, int program_size) {
+    // structural hashes of the subtrees that may be cached : without side effects, and reading no variable that the
+    // program changes
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    value_cache._program = NULL;
+    if (value_cache._max_size <= 0) {
+        return;
+    }
+    set<int> changed_variables;
+    for (int i = 0; i + 1 < program_size; ++i) {
+        if (program[i]._type == ITEM_FCALL && program[i + 1]._type == ITEM_VAR &&
+                (program[i]._value == F_ASSIGN || program[i]._value == F_VAR || program[i]._value == F_FOR)) {
+            changed_variables.insert(program[i + 1]._value);
+        }
+    }
+    value_cache._subtree_hashes.assign(program_size, 0);
+    value_cache._subtree_sizes.assign(program_size, 0);
+    vector<pair<unsigned long long, bool>> subtrees; // hash and cacheability of the subtrees after item i
+    for (int i = program_size - 1; i >= 0; --i) {
+        const Item& item = program[i];
+        if (item._arity > int(subtrees.size())) {
+            return; // not a valid program, run reports it
+        }
+        unsigned long long h = g_fnv_offset_basis;
+        fnv1a_update(h, (unsigned long long)(item._type), 4);
+        fnv1a_update(h, (unsigned long long)(item._value), 4);
+        fnv1a_update(h, (unsigned long long)(item._arity), 4);
+        bool cacheable = is_pure(program, i, i + 1) && !(item._type == ITEM_VAR && changed_variables.count(item._value));
+        int size = 1;
+        for (int k = 0; k < item._arity; ++k) {
+            fnv1a_update(h, subtrees.back().first, 8);
+            cacheable = cacheable && subtrees.back().second;
+            size += value_cache._subtree_sizes[i + size];
+            subtrees.pop_back();
+        }
+        subtrees.push_back({h, cacheable});
+        value_cache._subtree_sizes[i] = size;
+        if (cacheable && item._arity > 0) {
+            value_cache._subtree_hashes[i] = (h != 0 ? h : 1);
+        }
+    }
+    value_cache._program = program;
+}
+
+
+const SubtreeValue* find_subtree_value(const Item* program, int sp) {
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    unsigned long long key = value_cache._subtree_hashes[sp];
+    fnv1a_update(key, (unsigned long long)(g_input_index), 4);
+    auto it = value_cache._index.find(key);
+    if (it != value_cache._index.end()) {
+        const CachedSubtree& cached = value_cache._entries[it->second];
+        int size = value_cache._subtree_sizes[sp];
+        if (cached._input == g_input_index && int(cached._code.size()) == size && equal(cached._code.begin(), cached._code.end(), program + sp)) {
+            unlink_cached_subtree(it->second);
+            link_cached_subtree_first(it->second);
+            value_cache._hits++;
+            return &cached._value;
+        }
+    }
+    value_cache._misses++;
+    return NULL;
+}
+
+
+void cache_subtree_value(const Item* program, int sp, const SubtreeValue& value) {
+    SubtreeValueCache& value_cache = g_subtree_value_cache;
+    unsigned long long key = value_cache._subtree_hashes[sp];
+    fnv1a_update(key, (unsigned long long)(g_input_index), 4);
+    int i;
+    auto it = value_cache._index.find(key);
+    if (it != value_cache._index.end()) {
+        i = it->second; // a hash collision : the newest value wins
+        unlink_cached_subtree(i);
+    } else if (int(value_cache._entries.size()) < value_cache._max_size) {
+        i = int(value_cache._entries.size());
+        value_cache._entries.push_back({});
+    } else {
+        i = value_cache._last; // the least recently used value makes room
+        unlink_cached_subtree(i);
+        value_cache._index.erase(value_cache._entries[i]._key);
+    }
+    CachedSubtree& entry = value_cache._entries[i];
+    entry._key = key;
+    entry._code.assign(program + sp, program + sp + value._size);
+    entry._input = g_input_index;
+    entry._value = value;
+    value_cache._index[key] = i;
+    link_cached_subtree_first(i);
+}
+
+
+void convert_batch_inputs(
+        int n_inputs, int n_params, int* param_sizes, Item* params, int n_local_variables,
+        int* expected_output_sizes, int* expected_outputs,
+        vector<vector<List>>& input_variables, vector<int*>& expected_output_starts
+) {
+    // convert the inputs once for the whole batch
+    input_variables.resize(n_inputs);
+    for (int i = 0; i < n_inputs; ++i) {
+        vector<List>& variables = input_variables[i];
+        variables.resize(n_params + n_local_variables);
+        for (int j = 0; j < n_params; ++j) {
+            int n = param_sizes[i * n_params + j];
+            variables[j].resize(n);
+            for (int k = 0; k < n; ++k) {
+                variables[j][k] = *params;
+                params++;
+            }
+        }
+        for (int j = 0; j < n_local_variables; ++j) {
+            variables[n_params + j] = {{ITEM_INT, 0, 0}};
+        }
+    }
+    for (int i = 0; i < n_inputs; ++i) {
+        expected_output_starts.push_back(expected_outputs);
+        expected_outputs += expected_output_sizes[i];
+    }
+}
+
+
+void compute_error_matrix_of_program(
+        const Item* program, int program_size,
+        const vector<vector<List>>& input_variables, int* expected_output_sizes, const vector<int*>& expected_output_starts,
+        int penalise_non_reacting_models,
+        double* error_matrix, // n_inputs x 8
+        unsigned long long* output_fingerprints, // n_inputs
+        unsigned long long* family_key, // 2 : fingerprint of all outputs, fingerprint of the error matrix
+        int debug
+) {
+    const int error_vector_size = 8;
+    int n_inputs = int(input_variables.size());
+    vector<List> outputs;
+    outputs.resize(n_inputs);
+    List actual_output;
+    vector<Function> functions;
+    bool all_outputs_same = true;
+    unsigned long long outputs_key = g_fnv_offset_basis;
+    prepare_subtree_value_cache(program, program_size);
+    for (int i = 0; i < n_inputs; ++i) {
+        vector<List> variables = input_variables[i];
+        functions.clear();
+        g_input_index = i;
+        outputs[i] = run(program, program_size, variables, functions, debug > 1);
+        if (outputs[i].size() == 0) {
+            outputs[i] = {{ITEM_INT, 0, 0}};
+        }
+        output_fingerprints[i] = compute_output_fingerprint(outputs[i]);
+        fnv1a_update(outputs_key, output_fingerprints[i], 8);
+        if (i > 0 && !is_same_output(outputs[i], outputs[0])) {
+            all_outputs_same = false;
+        }
+        // compute_error_vector_impl may rewrite an int output to a list of length 1, which needs room for 2 items
+        actual_output = outputs[i];
+        actual_output.resize(actual_output.size() + 1);
+        g_native_evaluators[g_native_evaluator](expected_output_sizes[i], expected_output_starts[i],
+            int(outputs[i].size()), &actual_output[0], error_vector_size, error_matrix + i * error_vector_size, debug);
+    }
+    if (penalise_non_reacting_models && all_outputs_same && n_inputs > 0) {
+        int worst = 0;
+        double worst_sum = sum_error_vector(error_matrix);
+        for (int i = 1; i < n_inputs; ++i) {
+            double s = sum_error_vector(error_matrix + i * error_vector_size);
+            if (worst_sum < s) {
+                worst = i;
+                worst_sum = s;
+            }
+        }
+        for (int i = 0; i < n_inputs; ++i) {
+            for (int k = 0; k < error_vector_size; ++k) {
+                error_matrix[i * error_vector_size + k] = error_matrix[worst * error_vector_size + k];
+            }
+        }
+    }
+    g_subtree_value_cache._program = NULL;
+    family_key[0] = outputs_key;
+    family_key[1] = compute_error_matrix_fingerprint(error_matrix, n_inputs * error_vector_size);
+}
+
+
+void record_subtree_values(const Item* program, int program_size, const vector<vector<List>>& input_variables, int parent) {
+    SubtreeCache& cache = g_subtree_cache;
+    int n_inputs = int(input_variables.size());
+    cache._values[parent].resize(n_inputs);
+    vector<Function> functions;
+    cache._program = program;
+    cache._record_parent = parent;
+    for (int i = 0; i < n_inputs; ++i) {
+        cache._values[parent][i].assign(program_size, {false, {}, 0, 0, 0});
+        g_input_index = i;
+        g_max_depth = 0;
+        vector<List> variables = input_variables[i];
+        functions.clear();
+        run(program, program_size, variables, functions, false);
+    }
+    cache._program = NULL;
+    cache._record_parent = -1;
+}
+
+
+extern "C"
+#if defined(_MSC_VER)
+__declspec(dllexport)
+#endif
+int compute_error_matrices(
+        int n_programs, int* program_sizes, Item* programs, // program[p] = programs[sum(program_sizes[:p]):sum(program_sizes[:p+1])]
+        int n_inputs, int n_params, int* param_sizes, Item* params, // param_sizes[i*n_params + j] is size of param j of input i
+        int n_local_variables,
+        int* expected_output_sizes, int* expected_outputs, // expected output i is concatenated after expected output i-1
+        int penalise_non_reacting_models,
+        double* error_matrices, // n_programs x n_inputs x 8
+        unsigned long long* output_fingerprints, // n_programs x n_inputs
+        unsigned long long* family_keys, // n_programs x 2 : fingerprint of all outputs, fingerprint of the error matrix
+        int debug
+) {
+    const int error_vector_size = 8;
+    if (debug) {
+        printf("C++ compute_error_matrices start, %d programs, %d inputs\n", n_programs, n_inputs);
+    }
+    vector<vector<List>> input_variables;
+    vector<int*> expected_output_starts;
+    convert_batch_inputs(n_inputs, n_params, param_sizes, params, n_local_variables, expected_output_sizes, expected_outputs,
+        input_variables, expected_output_starts);
+    check_subtree_value_cache_inputs(input_variables);
+    for (int p = 0; p < n_programs; ++p) {
+        compute_error_matrix_of_program(programs, program_sizes[p], input_variables, expected_output_sizes, expected_output_starts,
+            penalise_non_reacting_models, error_matrices + p * n_inputs * error_vector_size, output_fingerprints + p * n_inputs,
+            family_keys + p * 2, debug);
+        programs += program_sizes[p];
+    }
+    if (debug) {
+        printf("C++ compute_error_matrices ends\n");
+    }
+    return 0;
+}
+
+
+extern "C"
+#if defined(_MSC_VER)
+__declspec(dllexport)
+#endif
+int compute_error_matrices_of_splices(
+        int parent1_size, Item* parent1, int parent2_size, Item* parent2,
+        int n_splices, int* splices, // child s is parent1 with its subtree at splices[2*s] replaced by the subtree of parent2 at splices[2*s+1]
+        int n_inputs, int n_params, int* param_sizes, Item* params, // as compute_error_matrices
+        int n_local_variables,
+        int* expected_output_sizes, int* expected_outputs,
+        int penalise_non_reacting_models,
+        double* error_matrices, // n_splices x n_inputs x 8
+        unsigned long long* output_fingerprints, // n_splices x n_inputs
+        unsigned long long* family_keys, // n_splices x 2
+        int debug
+) {
+    const int error_vector_size = 8;
+    if (debug) {
+        printf("C++ compute_error_matrices_of_splices start, %d splices, %d inputs\n", n_splices, n_inputs);
+    }
+    vector<vector<List>> input_variables;
+    vector<int*> expected_output_starts;
+    convert_batch_inputs(n_inputs, n_params, param_sizes, params, n_local_variables, expected_output_sizes, expected_outputs,
+        input_variables, expected_output_starts);
+    check_subtree_value_cache_inputs(input_variables);
+    // incremental evaluation : the parents are run once, and in a child without side effects only the subtrees that
+    // are not a subtree of a parent, that is the path from the splice to the root, are run again
+    SubtreeCache& cache = g_subtree_cache;
+    bool use_parent1 = !debug && is_pure(parent1, 0, parent1_size);
+    bool use_parent2 = use_parent1 && is_pure(parent2, 0, parent2_size);
+    vector<int> ends1(parent1_size);
+    if (use_parent1) {
+        record_subtree_values(parent1, parent1_size, input_variables, 0);
+        for (int i = 0; i < parent1_size; ++i) {
+            ends1[i] = i;
+            skip_subtree(parent1, ends1[i]);
+        }
+    }
+    if (use_parent2) {
+        record_subtree_values(parent2, parent2_size, input_variables, 1);
+    }
+    List child;
+    for (int s = 0; s < n_splices; ++s) {
+        int index1 = splices[2 * s], index2 = splices[2 * s + 1];
+        int end1 = index1, end2 = index2;
+        skip_subtree(parent1, end1);
+        skip_subtree(parent2, end2);
+        child.assign(parent1, parent1 + index1);
+        child.insert(child.end(), parent2 + index2, parent2 + end2);
+        child.insert(child.end(), parent1 + end1, parent1 + parent1_size);
+        if (use_parent1 && is_pure(parent2, index2, end2)) {
+            int size2 = end2 - index2;
+            cache._lookup.assign(child.size(), {-1, 0});
+            for (int i = 0; i < index1; ++i) {
+                if (ends1[i] <= index1) {
+                    cache._lookup[i] = {0, i}; // not an ancestor of the splice
+                }
+            }
+            if (use_parent2) {
+                for (int i = 0; i < size2; ++i) {
+                    cache._lookup[index1 + i] = {1, index2 + i};
+                }
+            }
+            for (int i = index1 + size2; i < int(child.size()); ++i) {
+                cache._lookup[i] = {0, i - index1 - size2 + end1};
+            }
+            cache._program = &child[0];
+        }
+        compute_error_matrix_of_program(&child[0], int(child.size()), input_variables, expected_output_sizes, expected_output_starts,
+            penalise_non_reacting_models, error_matrices + s * n_inputs * error_vector_size, output_fingerprints + s * n_inputs,
+            family_keys + s * 2, debug);
+        cache._program = NULL;
+    }
+    if (debug) {
+        printf("C++ compute_error_matrices_of_splices ends\n");
+    }
+    return 0;
+}
+
+
+extern "C"
+#if defined(_MSC_VER)
+__declspec(dllexport)
+#endif
+void set_subtree_value_cache_size(int max_size) {
+    g_subtree_value_cache._max_size = max_size;
+    clear_subtree_value_cache();
+}
+
+
+extern "C"
+#if defined(_MSC_VER)
+__declspec(dllexport)
+#endif
+void get_subtree_value_cache_counters(unsigned long long* counters) {
+    // hits, misses, number of cached values
+    const SubtreeValueCache& value_cache = g_subtree_value_cache;
+    counters[0] = value_cache._hits;
+    counters[1] = value_cache._misses;
+    counters[2] = value_cache._entries.size();
+}
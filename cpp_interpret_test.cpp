@@ -830,6 +830,248 @@ void test_e1() {
 }
 
 
+// error weights set via set_error_weights
+void test_e2() {
+    int err_count = 0;
+    vector<int> expect = {84, 85};
+    vector<Item> actual = {{ITEM_LIST, 0, 2}, {ITEM_LIST, 0, 0}, {ITEM_LIST, 0, 0}};
+    vector<double> error; error.resize(8);
+    vector<double> weights = {1.0, 2.0, 1.1, 1.5, 1.5, 1.5, 1.0, 1.0, 1.0};
+    set_error_weights(&weights[0]);
+    vector<double> expected_error = {2.0, 0.0, pow(84.0,1.5)+pow(85.0,1.5), pow(84.0,1.5), pow(84.0,1.5)+pow(85.0,1.5),
+        2.0, 2.0, 2.0};
+    compute_error_vector(int(expect.size()), &expect[0], int(actual.size()), &actual[0], int(error.size()), &error[0], 0);
+    check_error(error, expected_error, __LINE__, err_count);
+    vector<double> default_weights = {0.3, 1.5, 1.1, 1.6, 1.5, 1.5, 0.1, 0.1, 0.4};
+    set_error_weights(&default_weights[0]);
+    printf("%d errors encountered in test_e2\n", err_count);
+}
+
+
+// native evaluators of the other error functions, see evaluate.native_error_functions
+void test_e3() {
+    int err_count = 0;
+    vector<double> error; error.resize(8);
+    vector<Item> actual;
+    vector<int> expect;
+    vector<double> expected_error;
+
+    // compute_error_exact_*
+    set_native_evaluator(3);
+    expect = {85};
+    actual = {{ITEM_INT, 85, 0}};
+    expected_error = {0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0};
+    compute_error_vector(int(expect.size()), &expect[0], int(actual.size()), &actual[0], int(error.size()), &error[0], 0);
+    check_error(error, expected_error, __LINE__, err_count);
+    actual = {{ITEM_LIST, 0, 1}, {ITEM_INT, 85, 0}};
+    expected_error = {1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0};
+    compute_error_vector(int(expect.size()), &expect[0], int(actual.size()), &actual[0], int(error.size()), &error[0], 0);
+    check_error(error, expected_error, __LINE__, err_count);
+
+    // compute_error_int
+    set_native_evaluator(2);
+    expect = {15};
+    actual = {{ITEM_LIST, 0, 2}, {ITEM_INT, 7, 0}, {ITEM_INT, 15, 0}};
+    expected_error = {1.0, 0.0, pow(8.0, 1.2), 0.0, 0.0, 0.0, 0.0, 0.0};
+    compute_error_vector(int(expect.size()), &expect[0], int(actual.size()), &actual[0], int(error.size()), &error[0], 0);
+    check_error(error, expected_error, __LINE__, err_count);
+
+    // compute_error_is_sorted : len(data) 4, 1 pair out of order
+    set_native_evaluator(6);
+    expect = {4, 1};
+    actual = {{ITEM_INT, 1, 0}};
+    expected_error = {1.0 / 3, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0};
+    compute_error_vector(int(expect.size()), &expect[0], int(actual.size()), &actual[0], int(error.size()), &error[0], 0);
+    check_error(error, expected_error, __LINE__, err_count);
+
+    // compute_error_board_col : board ((1 2) (3 4)), col 1
+    set_native_evaluator(4);
+    expect = {2, 1, 2, 4, 1, 2, 3, 4};
+    actual = {{ITEM_LIST, 0, 2}, {ITEM_INT, 2, 0}, {ITEM_INT, 3, 0}};
+    expected_error = {0.0, 0.0, 0.0, 0.0, 0.1, 0.11, 0.0, 0.0};
+    compute_error_vector(int(expect.size()), &expect[0], int(actual.size()), &actual[0], int(error.size()), &error[0], 0);
+    check_error(error, expected_error, __LINE__, err_count);
+
+    if (set_native_evaluator(-1) == 0) {
+        printf("test e3 line %d, invalid native evaluator accepted\n", __LINE__);
+        err_count++;
+    }
+    set_native_evaluator(0);
+    printf("%d errors encountered in test_e3\n", err_count);
+}
+
+
+// compute_error_matrices must give the same results as the single program interface
+void test_batch1() {
+    int err_count = 0;
+    // merge_elem(elem, sorted_data), 3 inputs
+    vector<int> param_sizes = {1, 1, 1, 2, 1, 3};
+    vector<Item> params = {
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 0},
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 1}, {ITEM_INT, 83, 0},
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 2}, {ITEM_INT, 85, 0}, {ITEM_INT, 87, 0},
+    };
+    vector<int> expected_output_sizes = {1, 2, 3};
+    vector<int> expected_outputs = {84, 83, 84, 84, 85, 87};
+    int n_inputs = 3, n_params = 2, n_locals = 0;
+    vector<List> programs = {
+        {{ITEM_FCALL, F_CONS, 2}, {ITEM_VAR, 0, 0}, {ITEM_VAR, 1, 0}}, // (cons elem sorted_data)
+        {{ITEM_FCALL, F_APPEND, 2}, {ITEM_VAR, 1, 0}, {ITEM_VAR, 0, 0}}, // (append sorted_data elem)
+        {{ITEM_VAR, 0, 0}}, // elem : a non reacting model
+        {{ITEM_FCALL, F_LEN, 1}, {ITEM_VAR, 1, 0}}, // (len sorted_data)
+    };
+    vector<int> program_sizes;
+    List all_programs;
+    for (const List& program : programs) {
+        program_sizes.push_back(int(program.size()));
+        all_programs.insert(all_programs.end(), program.begin(), program.end());
+    }
+    int n_programs = int(programs.size());
+    vector<double> error_matrices(n_programs * n_inputs * 8);
+    vector<unsigned long long> fingerprints(n_programs * n_inputs);
+    vector<unsigned long long> family_keys(n_programs * 2);
+    compute_error_matrices(n_programs, &program_sizes[0], &all_programs[0], n_inputs, n_params, &param_sizes[0], &params[0],
+        n_locals, &expected_output_sizes[0], &expected_outputs[0], 0, &error_matrices[0], &fingerprints[0], &family_keys[0], 0);
+    for (int p = 0; p < n_programs; ++p) {
+        int params_offset = 0, expected_offset = 0;
+        for (int i = 0; i < n_inputs; ++i) {
+            vector<Item> output_buf(1000);
+            int n_output = 0;
+            run_non_recursive_level1_function(n_params, &param_sizes[i * n_params], &params[params_offset], n_locals,
+                &programs[p][0], int(programs[p].size()), int(output_buf.size()), &output_buf[0], &n_output, 0);
+            vector<double> error(8);
+            compute_error_vector(expected_output_sizes[i], &expected_outputs[expected_offset], n_output, &output_buf[0],
+                int(error.size()), &error[0], 0);
+            vector<double> batch_error(&error_matrices[(p * n_inputs + i) * 8], &error_matrices[(p * n_inputs + i) * 8 + 8]);
+            check_error(batch_error, error, __LINE__, err_count);
+            params_offset += param_sizes[i * n_params] + param_sizes[i * n_params + 1];
+            expected_offset += expected_output_sizes[i];
+        }
+    }
+    if (fingerprints[2 * n_inputs + 0] != fingerprints[2 * n_inputs + 1] || fingerprints[0] == fingerprints[1]) {
+        printf("%d: fingerprints must be equal for equal outputs only\n", __LINE__);
+        err_count += 1;
+    }
+    if (family_keys[0] == family_keys[2] || family_keys[1] == family_keys[3]) {
+        printf("%d: family keys of programs with different outputs must differ\n", __LINE__);
+        err_count += 1;
+    }
+
+    // penalise non reacting models : program 2 gets the worst error vector on all inputs
+    compute_error_matrices(n_programs, &program_sizes[0], &all_programs[0], n_inputs, n_params, &param_sizes[0], &params[0],
+        n_locals, &expected_output_sizes[0], &expected_outputs[0], 1, &error_matrices[0], &fingerprints[0], &family_keys[0], 0);
+    for (int i = 0; i < n_inputs; ++i) {
+        vector<double> error(&error_matrices[(2 * n_inputs + i) * 8], &error_matrices[(2 * n_inputs + i) * 8 + 8]);
+        vector<double> worst(&error_matrices[(2 * n_inputs + 2) * 8], &error_matrices[(2 * n_inputs + 2) * 8 + 8]);
+        check_error(error, worst, __LINE__, err_count);
+    }
+
+    printf("%d errors encountered in test_batch1\n", err_count);
+}
+
+
+void test_batch2() {
+    int err_count = 0;
+    // merge_elem(elem, sorted_data), 3 inputs : the splices of two parents give the same as the spliced programs
+    vector<int> param_sizes = {1, 1, 1, 2, 1, 3};
+    vector<Item> params = {
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 0},
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 1}, {ITEM_INT, 83, 0},
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 2}, {ITEM_INT, 85, 0}, {ITEM_INT, 87, 0},
+    };
+    vector<int> expected_output_sizes = {1, 2, 3};
+    vector<int> expected_outputs = {84, 83, 84, 84, 85, 87};
+    int n_inputs = 3, n_params = 2, n_locals = 0;
+    List parent1 = {{ITEM_FCALL, F_CONS, 2}, {ITEM_VAR, 0, 0}, {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 1, 0}}; // (cons elem (rest sorted_data))
+    List parent2 = {{ITEM_FCALL, F_APPEND, 2}, {ITEM_VAR, 1, 0}, {ITEM_VAR, 0, 0}}; // (append sorted_data elem)
+    vector<int> splices = {0, 0, 2, 0, 3, 2, 1, 1};
+    vector<List> programs = {
+        {{ITEM_FCALL, F_APPEND, 2}, {ITEM_VAR, 1, 0}, {ITEM_VAR, 0, 0}},
+        {{ITEM_FCALL, F_CONS, 2}, {ITEM_VAR, 0, 0}, {ITEM_FCALL, F_APPEND, 2}, {ITEM_VAR, 1, 0}, {ITEM_VAR, 0, 0}},
+        {{ITEM_FCALL, F_CONS, 2}, {ITEM_VAR, 0, 0}, {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 0, 0}},
+        {{ITEM_FCALL, F_CONS, 2}, {ITEM_VAR, 1, 0}, {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 1, 0}},
+    };
+    vector<int> program_sizes;
+    List all_programs;
+    for (const List& program : programs) {
+        program_sizes.push_back(int(program.size()));
+        all_programs.insert(all_programs.end(), program.begin(), program.end());
+    }
+    int n_programs = int(programs.size());
+    vector<double> error_matrices(n_programs * n_inputs * 8), splice_error_matrices(n_programs * n_inputs * 8);
+    vector<unsigned long long> fingerprints(n_programs * n_inputs), splice_fingerprints(n_programs * n_inputs);
+    vector<unsigned long long> family_keys(n_programs * 2), splice_family_keys(n_programs * 2);
+    compute_error_matrices(n_programs, &program_sizes[0], &all_programs[0], n_inputs, n_params, &param_sizes[0], &params[0],
+        n_locals, &expected_output_sizes[0], &expected_outputs[0], 1, &error_matrices[0], &fingerprints[0], &family_keys[0], 0);
+    compute_error_matrices_of_splices(int(parent1.size()), &parent1[0], int(parent2.size()), &parent2[0], n_programs, &splices[0],
+        n_inputs, n_params, &param_sizes[0], &params[0], n_locals, &expected_output_sizes[0], &expected_outputs[0], 1,
+        &splice_error_matrices[0], &splice_fingerprints[0], &splice_family_keys[0], 0);
+    check_error(splice_error_matrices, error_matrices, __LINE__, err_count);
+    if (splice_fingerprints != fingerprints || splice_family_keys != family_keys) {
+        printf("%d: fingerprints and family keys of the splices must be those of the spliced programs\n", __LINE__);
+        err_count += 1;
+    }
+    printf("%d errors encountered in test_batch2\n", err_count);
+}
+
+
+void test_batch3() {
+    int err_count = 0;
+    // the subtree value cache gives the same results, and is used for the subtrees that the programs have in common
+    vector<int> param_sizes = {1, 1, 1, 2, 1, 3};
+    vector<Item> params = {
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 0},
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 1}, {ITEM_INT, 83, 0},
+        {ITEM_INT, 84, 0}, {ITEM_LIST, 0, 2}, {ITEM_INT, 85, 0}, {ITEM_INT, 87, 0},
+    };
+    vector<int> expected_output_sizes = {1, 2, 3};
+    vector<int> expected_outputs = {84, 83, 84, 84, 85, 87};
+    int n_inputs = 3, n_params = 2, n_locals = 1;
+    vector<List> programs = {
+        {{ITEM_FCALL, F_CONS, 2}, {ITEM_VAR, 0, 0}, {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 1, 0}}, // (cons elem (rest sorted_data))
+        {{ITEM_FCALL, F_APPEND, 2}, {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 1, 0}, {ITEM_VAR, 0, 0}}, // (append (rest sorted_data) elem)
+        // (extend (assign k (rest sorted_data)) (rest k)) : (rest k) reads a changed variable
+        {{ITEM_FCALL, F_EXTEND, 2}, {ITEM_FCALL, F_ASSIGN, 2}, {ITEM_VAR, 2, 0}, {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 1, 0},
+            {ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 2, 0}},
+        {{ITEM_FCALL, F_REST, 1}, {ITEM_VAR, 2, 0}}, // (rest k)
+    };
+    vector<int> program_sizes;
+    List all_programs;
+    for (const List& program : programs) {
+        program_sizes.push_back(int(program.size()));
+        all_programs.insert(all_programs.end(), program.begin(), program.end());
+    }
+    int n_programs = int(programs.size());
+    vector<double> error_matrices(n_programs * n_inputs * 8), cached_error_matrices(n_programs * n_inputs * 8);
+    vector<unsigned long long> fingerprints(n_programs * n_inputs), cached_fingerprints(n_programs * n_inputs);
+    vector<unsigned long long> family_keys(n_programs * 2), cached_family_keys(n_programs * 2);
+    set_subtree_value_cache_size(0);
+    compute_error_matrices(n_programs, &program_sizes[0], &all_programs[0], n_inputs, n_params, &param_sizes[0], &params[0],
+        n_locals, &expected_output_sizes[0], &expected_outputs[0], 1, &error_matrices[0], &fingerprints[0], &family_keys[0], 0);
+    set_subtree_value_cache_size(100);
+    vector<unsigned long long> counters(3);
+    get_subtree_value_cache_counters(&counters[0]);
+    unsigned long long hits = counters[0];
+    compute_error_matrices(n_programs, &program_sizes[0], &all_programs[0], n_inputs, n_params, &param_sizes[0], &params[0],
+        n_locals, &expected_output_sizes[0], &expected_outputs[0], 1, &cached_error_matrices[0], &cached_fingerprints[0],
+        &cached_family_keys[0], 0);
+    check_error(cached_error_matrices, error_matrices, __LINE__, err_count);
+    if (cached_fingerprints != fingerprints || cached_family_keys != family_keys) {
+        printf("%d: fingerprints and family keys must not depend on the subtree value cache\n", __LINE__);
+        err_count += 1;
+    }
+    get_subtree_value_cache_counters(&counters[0]);
+    // per input : (rest sorted_data) is found in program 1 and 2; cons, (rest sorted_data), append, (rest k) of program 3 are cached
+    if (int(counters[0] - hits) != 2 * n_inputs || int(counters[2]) != 4 * n_inputs) {
+        printf("%d: expected %d hits and %d cached values, not %llu hits and %llu values\n",
+            __LINE__, 2 * n_inputs, 4 * n_inputs, counters[0] - hits, counters[2]);
+        err_count += 1;
+    }
+    set_subtree_value_cache_size(0);
+    printf("%d errors encountered in test_batch3\n", err_count);
+}
+
+
 int main(int argc, char* argv[]) {
     try {
         if (true) {
@@ -842,6 +1084,11 @@ int main(int argc, char* argv[]) {
             test5();
             test6();
             test7();
+            test_batch1();
+            test_batch2();
+            test_batch3();
+            test_e2();
+            test_e3();
         }
         test_e1();
     }
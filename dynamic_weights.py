@@ -3,17 +3,19 @@ import math
 import numpy as np
 
 
-global dynamic_weights_matrix, estimated_remaining_iterations_matrix, simplify
+global dynamic_weights_matrix, estimated_remaining_iterations_matrix, simplify, weights_epoch
 dynamic_weights_matrix = None
 estimated_remaining_iterations_matrix= None
+weights_epoch = 0 # incremented on each change of dynamic_weights_matrix, see ga_search_tools.Family.normalised_error
 
 
 def allocate_like(example):
-    global estimated_remaining_iterations_matrix, dynamic_weights_matrix
+    global estimated_remaining_iterations_matrix, dynamic_weights_matrix, weights_epoch
     if estimated_remaining_iterations_matrix is None or estimated_remaining_iterations_matrix.shape != example.shape:
         estimated_remaining_iterations_matrix = np.ones_like(example) * 100
     if dynamic_weights_matrix is None or dynamic_weights_matrix.shape != example.shape:
         dynamic_weights_matrix = np.ones_like(example)
+        weights_epoch += 1
 
 
 def compute_normalised_error_matrix(matrix):
@@ -34,21 +36,15 @@ def update_remaining_iterations_v1(prev_best_matrix, best_matrix, all_matrices):
     global estimated_remaining_iterations_matrix
     estimated_remaining_iterations_matrix += 1
     if prev_best_matrix is not None:
-        for i in range(estimated_remaining_iterations_matrix.shape[0]):
-            for j in range(estimated_remaining_iterations_matrix.shape[1]):
-                if prev_best_matrix[i, j] > best_matrix[i, j]:
-                    iters = best_matrix[i, j] / (prev_best_matrix[i, j] - best_matrix[i, j])
-                    if estimated_remaining_iterations_matrix[i, j] > iters:
-                        estimated_remaining_iterations_matrix[i, j] = iters
+        improved = prev_best_matrix > best_matrix
+        iters = best_matrix[improved] / (prev_best_matrix[improved] - best_matrix[improved])
+        estimated_remaining_iterations_matrix[improved] = np.minimum(estimated_remaining_iterations_matrix[improved], iters)
         estimated_remaining_iterations_matrix[prev_best_matrix == 0] = 1
     for matrix in all_matrices:
         if matrix is not best_matrix:
-            for i in range(estimated_remaining_iterations_matrix.shape[0]):
-                for j in range(estimated_remaining_iterations_matrix.shape[1]):
-                    if best_matrix[i, j] > matrix[i, j]:
-                        iters = best_matrix[i, j] / (best_matrix[i, j] - matrix[i, j])
-                        if estimated_remaining_iterations_matrix[i, j] > iters:
-                            estimated_remaining_iterations_matrix[i, j] = iters
+            better = best_matrix > matrix
+            iters = best_matrix[better] / (best_matrix[better] - matrix[better])
+            estimated_remaining_iterations_matrix[better] = np.minimum(estimated_remaining_iterations_matrix[better], iters)
             estimated_remaining_iterations_matrix[matrix == 0] = 1
     estimated_remaining_iterations_matrix[best_matrix == 0] = 0
 
@@ -57,57 +53,43 @@ def update_remaining_iterations_v2(prev_best_matrix, best_matrix, all_matrices):
     global estimated_remaining_iterations_matrix
     estimated_remaining_iterations_matrix += 1
     if prev_best_matrix is not None:
-        for i in range(estimated_remaining_iterations_matrix.shape[0]):
-            for j in range(estimated_remaining_iterations_matrix.shape[1]):
-                if prev_best_matrix[i, j] > best_matrix[i, j]:
-                    iters = best_matrix[i, j] / (prev_best_matrix[i, j] - best_matrix[i, j])
-                    estimated_remaining_iterations_matrix[i, j] = iters
-                elif prev_best_matrix[i, j] < best_matrix[i, j]:
-                    iters = best_matrix[i, j] / (best_matrix[i, j] - prev_best_matrix[i, j])
-                    estimated_remaining_iterations_matrix[i, j] = iters
+        changed = (prev_best_matrix > best_matrix) | (prev_best_matrix < best_matrix)
+        iters = best_matrix[changed] / np.abs(best_matrix[changed] - prev_best_matrix[changed])
+        estimated_remaining_iterations_matrix[changed] = iters
     estimated_remaining_iterations_matrix[best_matrix == 0] = 0
 
 
+def sort_components(iters, weights):
+    '''Returns the flat indices of the matrix components, sorted on their remaining iterations, ties on the weights'''
+    return np.argsort(iters + 1/(1000*weights), kind="stable") # stable : ties in row-major order
+
+
 def adjust_dynamic_weights_v1(adaptation_speed):
-    global estimated_remaining_iterations_matrix, dynamic_weights_matrix
+    global estimated_remaining_iterations_matrix, dynamic_weights_matrix, weights_epoch
     beta = adaptation_speed
-    components = []
-    for i in range(estimated_remaining_iterations_matrix.shape[0]):
-        for j in range(estimated_remaining_iterations_matrix.shape[1]):
-            iters = estimated_remaining_iterations_matrix[i, j]
-            components.append([iters, i, j, dynamic_weights_matrix[i, j]])
-            if iters == 0 and dynamic_weights_matrix[i, j] > 0.1:
-                dynamic_weights_matrix[i, j] /= beta
-    components.sort(key=lambda item: item[0] + 1/(1000*item[3]))
-    n = (estimated_remaining_iterations_matrix.shape[0] * estimated_remaining_iterations_matrix.shape[1])
-    assert n == len(components)
-    for iters, i, j, _ in components[:n//3]:
-        if iters > 0:
-            if iters < components[n//2][0] and dynamic_weights_matrix[i, j] > 0.1:
-                dynamic_weights_matrix[i, j] /= beta
-    for iters, i, j, _ in components[2*n//3:]:
-        if iters > 0:
-            dynamic_weights_matrix[i, j] *= beta
+    iters = estimated_remaining_iterations_matrix.flatten()
+    order = sort_components(iters, dynamic_weights_matrix.flatten()) # on the weights before this adjustment
+    done = (iters == 0) & (dynamic_weights_matrix.flatten() > 0.1)
+    dynamic_weights_matrix.flat[np.flatnonzero(done)] /= beta
+    n = iters.size
+    low, high = order[:n//3], order[2*n//3:]
+    low = low[(iters[low] > 0) & (iters[low] < iters[order[n//2]]) & (dynamic_weights_matrix.flat[low] > 0.1)]
+    dynamic_weights_matrix.flat[low] /= beta
+    dynamic_weights_matrix.flat[high[iters[high] > 0]] *= beta
     # dynamic_weights_matrix *= n / np.sum(dynamic_weights_matrix)
+    weights_epoch += 1
 
 
 def adjust_dynamic_weights_v2(adaptation_speed):
-    global estimated_remaining_iterations_matrix, dynamic_weights_matrix
+    global estimated_remaining_iterations_matrix, dynamic_weights_matrix, weights_epoch
     beta = adaptation_speed
-    components = []
-    for i in range(estimated_remaining_iterations_matrix.shape[0]):
-        for j in range(estimated_remaining_iterations_matrix.shape[1]):
-            iters = estimated_remaining_iterations_matrix[i, j]
-            components.append([iters, i, j, dynamic_weights_matrix[i, j]])
-    components.sort(key=lambda item: item[0] + 1/(1000*item[3]))
-    n = (estimated_remaining_iterations_matrix.shape[0] * estimated_remaining_iterations_matrix.shape[1])
-    assert n == len(components)
+    order = sort_components(estimated_remaining_iterations_matrix.flatten(), dynamic_weights_matrix.flatten())
+    n = order.size
     m = 2 # dynamic_weights_matrix.shape[1]
-    for iters, i, j, _ in components[:n*1//m]:
-        dynamic_weights_matrix[i, j] /= beta
-    for iters, i, j, _ in components[n*(m-1)//m:]:
-        dynamic_weights_matrix[i, j] *= beta
+    dynamic_weights_matrix.flat[order[:n*1//m]] /= beta
+    dynamic_weights_matrix.flat[order[n*(m-1)//m:]] *= beta
     # dynamic_weights_matrix *= n / np.sum(dynamic_weights_matrix)
+    weights_epoch += 1
  
 
 def dump_matrix(f, matrix):
@@ -2,6 +2,7 @@
 import sys
 import numpy as np
 import copy
+import itertools
 import math
 # import time
 import interpret
@@ -108,12 +109,12 @@ def compute_error_int(actual, expect, debug=False):
     # error : length
     error = 0.0
     if type(actual) != type(1):
-        actual_numbers = extract_numbers_set(actual)
+        actual_numbers = extract_numbers_list(actual)
         if len(actual_numbers) == 0:
             error += 1.0
             actual = expect + 1000
         else:
-            actual = list(actual_numbers)[0]
+            actual = actual_numbers[0] # the first number, as compute_error_vector_int in C++
     errors.append(error)
     # error : hoever zitten de expect getallen van de model getallen af
     error = (abs(float(actual) - float(expect))) ** 1.2
@@ -230,6 +231,127 @@ def compute_error_list_of_ints(actual, expect, debug=False):
     return errors
 
 
+def _pad(rows, dtype=np.int64):
+    '''Returns (values, mask) : the ragged rows padded with zeros to a matrix, and which entries are real'''
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    width = max(1, int(np.max(lengths))) if len(rows) > 0 else 1
+    mask = np.arange(width)[None, :] < lengths[:, None]
+    values = np.zeros(mask.shape, dtype=dtype)
+    values[mask] = np.fromiter(itertools.chain.from_iterable(rows), dtype=dtype, count=int(np.sum(lengths)))
+    return values, mask
+
+
+def _sum_in_order(terms):
+    '''Sum over the rows, in the order of the python loops in compute_error_list_of_ints, so that rounding is equal'''
+    result = np.zeros(terms.shape[0])
+    for k in range(terms.shape[1]):
+        result += terms[:, k]
+    return result
+
+
+def _power(values, exponent):
+    '''values ** exponent, by python per distinct value : np.power may differ in the last bit from the C pow, that
+    compute_error_list_of_ints and the C++ evaluation use'''
+    distinct_values, inverse = np.unique(values, return_inverse=True)
+    return np.array([v ** exponent for v in distinct_values.tolist()], dtype=float)[inverse.reshape(values.shape)]
+
+
+def _distances_with_closest_numbers(x, values, values_mask):
+    '''_distance_with_closest_numbers of each x[i, j] with the numbers values[i][values_mask[i]]'''
+    x = np.minimum(x, 1000000)
+    values = np.where(values_mask, np.minimum(values, 1000000), 1000000000000) # padding is never the closest
+    distances = x[:, :, None] - values[:, None, :]
+    np.abs(distances, out=distances)
+    result = np.minimum(np.min(distances, axis=2), 1000000)
+    return np.where(np.any(values_mask, axis=1)[:, None], result, np.abs(x))
+
+
+def _count_out_of_order(expect, expect_mask, actual_list, actual_list_mask, backwards):
+    '''error6 (backwards=False) and error7 (backwards=True) of compute_error_list_of_ints, before the exponent'''
+    n, width = actual_list.shape
+    columns = np.arange(width)[None, :]
+    j = np.sum(actual_list_mask, axis=1) - 1 if backwards else np.zeros(n, dtype=np.int64)
+    error = np.zeros(n)
+    for i in (range(expect.shape[1]-1, -1, -1) if backwards else range(expect.shape[1])):
+        active = expect_mask[:, i]
+        match = (actual_list == expect[:, i:i+1]) & actual_list_mask
+        match &= (columns <= j[:, None]) if backwards else (columns >= j[:, None])
+        found = np.any(match, axis=1)
+        if backwards:
+            new_j = np.where(found, width - 1 - np.argmax(match[:, ::-1], axis=1), -1)
+        else:
+            new_j = np.where(found, np.argmax(match, axis=1), np.sum(actual_list_mask, axis=1))
+        j = np.where(active, new_j, j)
+        error += active & ~found
+    return error
+
+
+def compute_error_matrix_list_of_ints(actual_outputs, expected_outputs):
+    '''compute_error_list_of_ints for all outputs at once, returns the raw error matrix'''
+    n = len(actual_outputs)
+    assert n == len(expected_outputs)
+    int_type = type(1)
+    int_types = set([int_type])
+    is_list, heads, head_lengths, non_int_heads, actual_lists, actual_sets, empty_sublists = [], [], [], [], [], [], []
+    for i, (actual, expect) in enumerate(zip(actual_outputs, expected_outputs)):
+        assert type(expect) == type([])
+        is_list.append(type(actual) == type([]))
+        if not is_list[-1]:
+            assert type(actual) == type(1)
+            actual = [actual]
+        head_lengths.append(min(len(actual), len(expect)))
+        if int_types.issuperset(map(type, actual)):
+            # gewone lijst van getallen, veruit het meest voorkomend
+            heads.append(actual)
+            actual_list = actual if len(actual) > 0 else [0]
+            empty_sublists.append(0 if len(actual) > 0 else 1)
+        else:
+            head = actual[:len(expect)]
+            heads.append([a if type(a) == int_type else 0 for a in head])
+            non_int_heads.extend([(i, j) for j, a in enumerate(head) if type(a) != int_type])
+            actual_list = extract_numbers_list(actual)
+            empty_sublists.append(count_empty_sublists(actual))
+        actual_lists.append(actual_list)
+        actual_sets.append(list(set(actual_list)) or [0]) # python set order, as the loop of error4
+    is_list = np.array(is_list, dtype=bool)
+    expect, expect_mask = _pad(expected_outputs)
+    actual_list, actual_list_mask = _pad(actual_lists)
+    actual_set, actual_set_mask = _pad(actual_sets)
+    expect_len = np.sum(expect_mask, axis=1)
+    actual_list_len = np.sum(actual_list_mask, axis=1)
+    width = expect.shape[1]
+    head, _ = _pad(heads)
+    head = np.pad(head, ((0, 0), (0, max(0, width - head.shape[1]))))[:, :width]
+    head_mask = np.arange(width)[None, :] < np.array(head_lengths, dtype=np.int64)[:, None]
+    head_is_int = head_mask.copy()
+    if len(non_int_heads) > 0:
+        head_is_int[tuple(np.array(non_int_heads).T)] = False
+    errors = np.empty((n, 8))
+    # error1 : type difference
+    error = np.where(is_list, np.sum(expect_mask & ~head_is_int, axis=1), 1.0 + expect_len).astype(float)
+    errors[:, 0] = np.where(error > 0, _power(error, g_w1), error)
+    # error2 : aantal outputs
+    length_error = np.abs(actual_list_len - expect_len).astype(float)
+    errors[:, 1] = np.where(actual_list_len < expect_len, _power(length_error, g_w2a), _power(length_error, g_w2b))
+    # error3 : hoever zitten de expect getallen van de model getallen af
+    distances = _distances_with_closest_numbers(expect, actual_set, actual_set_mask).astype(float)
+    errors[:, 2] = _sum_in_order(np.where(expect_mask, _power(distances, g_w3), 0.0))
+    # error4 : hoever zitten de model getallen van de expect getallen af
+    distances = _distances_with_closest_numbers(actual_set, expect, expect_mask).astype(float)
+    errors[:, 3] = _sum_in_order(np.where(actual_set_mask, _power(distances, g_w4), 0.0))
+    # error5 : absolute verschil van de outputs met de gewenste output
+    distances = np.where(head_is_int, np.abs(head - expect), np.abs(expect)).astype(float)
+    errors[:, 4] = _sum_in_order(np.where(head_mask, _power(distances, g_w5), 0.0))
+    # error6 en error7 : hoeveel staan er in volgorde, van voor naar achter en van achter naar voren?
+    for k, backwards, w in [(5, False, g_w6), (6, True, g_w7)]:
+        error = _count_out_of_order(expect, expect_mask, actual_list, actual_list_mask, backwards)
+        errors[:, k] = np.where(error > 0, _power(error, w), error)
+    # error 8: # empty sublists
+    error = np.array(empty_sublists, dtype=float)
+    errors[:, 7] = np.where(error > 0, _power(error, g_w8), error)
+    return errors
+
+
 def find_col(board, v):
     for row in board:
         for col, v_col in enumerate(row):
@@ -304,87 +426,122 @@ def compute_error_board_col_diag_common(input, actual, extra_function_params, ex
          error_columns*w[4], error_correct_elements_ordered*w[5]]
 
 
-def compute_error_board_col(input, actual, extra_function_params, log_file, verbose):
+def expected_output_board_col(input):
     board, col = input
-    expect = [row[col] for row in board]
+    return [row[col] for row in board]
+
+
+def compute_error_board_col(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_board_col(input)
     error = compute_error_board_col_diag_common(input, actual, extra_function_params, expect, 1)
     return error
 
 
+def expected_output_board_diag1(input):
+    board = input[0]
+    return [row[i] for i, row in enumerate(board)]
+
+
 def compute_error_board_diag1(input, actual, extra_function_params, log_file, verbose):
     board = input[0]
     n = len(board)
-    expect = [row[i] for i, row in enumerate(board)]
+    expect = expected_output_board_diag1(input)
     return compute_error_board_col_diag_common(input, actual, extra_function_params, expect, n)
 
 
+def expected_output_board_diag2(input):
+    board = input[0]
+    n = len(board)
+    return [row[n-1 - i] for i, row in enumerate(board)]
+
+
 def compute_error_board_diag2(input, actual, extra_function_params, log_file, verbose):
     board = input[0]
     n = len(board)
-    expect = [row[n-1 - i] for i, row in enumerate(board)]
+    expect = expected_output_board_diag2(input)
     result = compute_error_board_col_diag_common(input, actual, extra_function_params, expect, n)
     return result
 
 
-def compute_error_get_row_sums(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_row_sums(input):
     board = input[0]
-    expect = []
-    expect += [sum(row) for row in board]
+    return [sum(row) for row in board]
+
+
+def compute_error_get_row_sums(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_row_sums(input)
     return compute_error_list_of_ints(actual, expect, False)
 
 
-def compute_error_get_col_sums(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_col_sums(input):
     board = input[0]
     n = len(board)
-    expect = []
-    expect += [sum([row[col] for row in board]) for col in range(n)]
+    return [sum([row[col] for row in board]) for col in range(n)]
+
+
+def compute_error_get_col_sums(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_col_sums(input)
     return compute_error_list_of_ints(actual, expect, False)
 
 
-def compute_error_get_diag_sums(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_diag_sums(input):
     board = input[0]
     n = len(board)
     expect = []
     expect.append(sum([board[i][i] for i in range(n)]))
     expect.append(sum([board[i][(n-1) - i] for i in range(n)]))
+    return expect
+
+
+def compute_error_get_diag_sums(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_diag_sums(input)
     return compute_error_list_of_ints(actual, expect, False)
 
 
-def compute_error_get_magic_number_n(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_magic_number_n(input):
     n = input[0]
     assert type(n) == type(1)
     assert n in [1, 2, 3, 4, 5, 6]
     expect = (n * (n * n + 1)) // 2
     if 1 <= n <= 6:
         assert expect == [0, 1, 5, 15, 34, 65, 111][n]
+    return expect
+
+
+def compute_error_get_magic_number_n(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_magic_number_n(input)
     result = compute_error_int(actual, expect, False)
     return result
 
 
-def compute_error_get_magic_number(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_magic_number(input):
     board = input[0]
     assert type(board) == type([])
     n = len(board)
     expect = (n * (n * n + 1)) // 2
     if 0 <= n <= 5:
         assert expect == [0, 1, 5, 15, 34, 65][n]
+    return expect
+
+
+def compute_error_get_magic_number(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_magic_number(input)
     return compute_error_int(actual, expect, False)
 
 
-def compute_error_are_all_equal(input, actual, extra_function_params, log_file, verbose):
+def expected_output_are_all_equal(input):
     values = input[0]
     expect = sum([1 if value == values[0] else 0 for value in values]) == len(values)
-    return compute_error_int(actual, int(expect), False)
+    return int(expect)
 
 
-def compute_error_is_magic(inputs, actual, extra_function_params, log_file, verbose):
-    error = 0.0
-    if type(actual) != type(1):
-        error += 0.64
-    else:
-        if actual not in [0, 1]:
-            error += 0.1
-    model_says_its_magic = bool(actual)
+def compute_error_are_all_equal(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_are_all_equal(input)
+    return compute_error_int(actual, expect, False)
+
+
+def expected_output_is_magic(inputs):
+    '''n, count_magic_rows, count_magic_cols, count_magic_diags'''
     board = inputs[0]
     n = len(board)
     magic_number = (n * (n * n + 1)) // 2
@@ -405,6 +562,18 @@ def compute_error_is_magic(inputs, actual, extra_function_params, log_file, verb
         count_magic_diags += 1
     if sum_diag2 == magic_number:
         count_magic_diags += 1
+    return [n, count_magic_rows, count_magic_cols, count_magic_diags]
+
+
+def compute_error_is_magic(inputs, actual, extra_function_params, log_file, verbose):
+    error = 0.0
+    if type(actual) != type(1):
+        error += 0.64
+    else:
+        if actual not in [0, 1]:
+            error += 0.1
+    model_says_its_magic = bool(actual)
+    n, count_magic_rows, count_magic_cols, count_magic_diags = expected_output_is_magic(inputs)
     if model_says_its_magic:
         error += 0.425 * (n - count_magic_rows) / n
         error += 0.325 * (n - count_magic_cols) / n
@@ -416,6 +585,16 @@ def compute_error_is_magic(inputs, actual, extra_function_params, log_file, verb
     return error,
 
 
+def expected_output_is_sorted(input):
+    '''len(data), count_out_of_order'''
+    data = input[0]
+    count_out_of_order = 0
+    for i in range(len(data) - 1):
+        if data[i] > data[i+1]:
+            count_out_of_order += 1
+    return [len(data), count_out_of_order]
+
+
 def compute_error_is_sorted(input, actual, extra_function_params, log_file, verbose):
     error = 0.0
     if type(actual) != type(1):
@@ -426,10 +605,7 @@ def compute_error_is_sorted(input, actual, extra_function_params, log_file, verb
     model_says_its_sorted = bool(actual)
 
     data = input[0]
-    count_out_of_order = 0
-    for i in range(len(data) - 1):
-        if data[i] > data[i+1]:
-            count_out_of_order += 1
+    _, count_out_of_order = expected_output_is_sorted(input)
 
     if model_says_its_sorted:
         if len(data) >= 2:        
@@ -441,36 +617,36 @@ def compute_error_is_sorted(input, actual, extra_function_params, log_file, verb
     return error,
 
 
-def compute_error_merge_elema(input, actual, extra_function_params, log_file, verbose):
+def expected_output_merge_elem(input):
     elem = input[0]
     data = input[1]
     for i in range(1, len(data)):
         assert data[i-1] <= data[i]
     expect = data + [elem] 
     expect.sort()
-    expect = expect[:-1]
+    return expect
+
 
+def expected_output_merge_elema(input):
+    return expected_output_merge_elem(input)[:-1]
+
+
+def compute_error_merge_elema(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_merge_elema(input)
     return compute_error_list_of_ints(actual, expect)
 
 
+def expected_output_merge_elemb(input):
+    return expected_output_merge_elem(input)[-1]
+
+
 def compute_error_merge_elemb(input, actual, extra_function_params, log_file, verbose):
-    elem = input[0]
-    data = input[1]
-    for i in range(1, len(data)):
-        assert data[i-1] <= data[i]
-    expect = data + [elem] 
-    expect.sort()
-    expect = expect[-1]
+    expect = expected_output_merge_elemb(input)
     return compute_error_list_of_ints([actual], [expect])
 
 
 def compute_error_merge_elem(input, actual, extra_function_params, log_file, verbose):
-    elem = input[0]
-    data = input[1]
-    for i in range(1, len(data)):
-        assert data[i-1] <= data[i]
-    expect = data + [elem] 
-    expect.sort()
+    expect = expected_output_merge_elem(input)
     return compute_error_list_of_ints(actual, expect)
 
 
@@ -488,79 +664,128 @@ def compute_error_merge_elemd(input, actual, extra_function_params, log_file, ve
     return a + b + [c]
 
 
-def compute_error_sort(input, actual, extra_function_params, log_file, verbose):
+def expected_output_sort(input):
     expect = copy.deepcopy(input[0])
     expect.sort()
+    return expect
+
+
+def compute_error_sort(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_sort(input)
     return compute_error_list_of_ints(actual, expect)
 
 
 # ================================== EXACT errors voor testen van laagjes ==================
 
 
+def expected_output_exact_inc(input):
+    return input[0] + 1
+
+
 def compute_error_exact_inc(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + 1
+    expect = expected_output_exact_inc(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_inc2(input):
+    return input[0] + 2
+
+
 def compute_error_exact_inc2(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + 2
+    expect = expected_output_exact_inc2(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_inc3(input):
+    return input[0] + 3
+
+
 def compute_error_exact_inc3(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + 3
+    expect = expected_output_exact_inc3(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_inc4(input):
+    return input[0] + 4
+
+
 def compute_error_exact_inc4(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + 4
+    expect = expected_output_exact_inc4(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_inc5(input):
+    return input[0] + 5
+
+
 def compute_error_exact_inc5(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + 5
+    expect = expected_output_exact_inc5(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_add(input):
+    return input[0] + input[1]
+
+
 def compute_error_exact_add(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + input[1]
+    expect = expected_output_exact_add(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_add_and_inc(input):
+    return (input[0] + input[1]) + 1
+
+
 def compute_error_exact_add_and_inc(input, actual, extra_function_params, log_file, verbose):
-    expect = (input[0] + input[1]) + 1
+    expect = expected_output_exact_add_and_inc(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_inc_and_add(input):
+    return (input[0] + 1) + (input[1] + 1)
+
+
 def compute_error_exact_inc_and_add(input, actual, extra_function_params, log_file, verbose):
-    expect = (input[0] + 1) + (input[1] + 1)
+    expect = expected_output_exact_inc_and_add(input)
     error = 0 if expect == actual else 1
     return error,
 
 
+def expected_output_exact_add3(input):
+    return input[0] + input[1] + input[2]
+
+
 def compute_error_exact_add3(input, actual, extra_function_params, log_file, verbose):
-    expect = input[0] + input[1] + input[2]
+    expect = expected_output_exact_add3(input)
     error = 0 if expect == actual else 1
     return error,
 
 
-def compute_error_get_diag1_cell(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_diag1_cell(input):
     board, i = input
-    expect = board[i][i]
+    return board[i][i]
+
+
+def compute_error_get_diag1_cell(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_diag1_cell(input)
     error = 0 if expect == actual else 1
     return error,
 
 
-def compute_error_get_diag2_cell(input, actual, extra_function_params, log_file, verbose):
+def expected_output_get_diag2_cell(input):
     board, i = input
-    expect = board[i][len(board)-1-i]
+    return board[i][len(board)-1-i]
+
+
+def compute_error_get_diag2_cell(input, actual, extra_function_params, log_file, verbose):
+    expect = expected_output_get_diag2_cell(input)
     error = 0 if expect == actual else 1
     return error,
 
@@ -572,22 +797,90 @@ def find_worst_raw_error_vector(raw_error_matrix):
     return raw_error_matrix[np.argmax(np.sum(raw_error_matrix, axis=1))]
 
 
-def compute_raw_error_matrix(example_inputs, actual_outputs, raw_error_function, log_file, verbose, penalise_non_reacting_models):
-    raw_error_matrix = []
+def native_expected_output_board_col_diag(input, expect, expect_cols):
+    '''n, expect_cols, expect, the board row by row'''
+    board = input[0]
+    return [len(board), expect_cols] + expect + [value for row in board for value in row]
+
+
+# native evaluators : index in g_native_evaluators in cpp_interpret.cpp
+NATIVE_LIST_OF_INTS, NATIVE_WRAPPED_LIST_OF_INTS, NATIVE_INT, NATIVE_EXACT, NATIVE_BOARD_COL_DIAG, NATIVE_IS_MAGIC, \
+    NATIVE_IS_SORTED = range(7)
+
+
+# per error function : the native evaluator and the function that computes the expected output of one example input,
+# an int or a list of ints.  compute_error_merge_elemd has none : it uses the non-existing compute_error_merge_elemc
+native_error_functions = {
+    "compute_error_merge_elem": (NATIVE_LIST_OF_INTS, expected_output_merge_elem),
+    "compute_error_merge_elema": (NATIVE_LIST_OF_INTS, expected_output_merge_elema),
+    "compute_error_merge_elemb": (NATIVE_WRAPPED_LIST_OF_INTS, expected_output_merge_elemb),
+    "compute_error_sort": (NATIVE_LIST_OF_INTS, expected_output_sort),
+    "compute_error_get_row_sums": (NATIVE_LIST_OF_INTS, expected_output_get_row_sums),
+    "compute_error_get_col_sums": (NATIVE_LIST_OF_INTS, expected_output_get_col_sums),
+    "compute_error_get_diag_sums": (NATIVE_LIST_OF_INTS, expected_output_get_diag_sums),
+    "compute_error_get_magic_number_n": (NATIVE_INT, expected_output_get_magic_number_n),
+    "compute_error_get_magic_number": (NATIVE_INT, expected_output_get_magic_number),
+    "compute_error_are_all_equal": (NATIVE_INT, expected_output_are_all_equal),
+    "compute_error_exact_inc": (NATIVE_EXACT, expected_output_exact_inc),
+    "compute_error_exact_inc2": (NATIVE_EXACT, expected_output_exact_inc2),
+    "compute_error_exact_inc3": (NATIVE_EXACT, expected_output_exact_inc3),
+    "compute_error_exact_inc4": (NATIVE_EXACT, expected_output_exact_inc4),
+    "compute_error_exact_inc5": (NATIVE_EXACT, expected_output_exact_inc5),
+    "compute_error_exact_add": (NATIVE_EXACT, expected_output_exact_add),
+    "compute_error_exact_add_and_inc": (NATIVE_EXACT, expected_output_exact_add_and_inc),
+    "compute_error_exact_inc_and_add": (NATIVE_EXACT, expected_output_exact_inc_and_add),
+    "compute_error_exact_add3": (NATIVE_EXACT, expected_output_exact_add3),
+    "compute_error_get_diag1_cell": (NATIVE_EXACT, expected_output_get_diag1_cell),
+    "compute_error_get_diag2_cell": (NATIVE_EXACT, expected_output_get_diag2_cell),
+    "compute_error_board_col": (NATIVE_BOARD_COL_DIAG, \
+        lambda input: native_expected_output_board_col_diag(input, expected_output_board_col(input), 1)),
+    "compute_error_board_diag1": (NATIVE_BOARD_COL_DIAG, \
+        lambda input: native_expected_output_board_col_diag(input, expected_output_board_diag1(input), len(input[0]))),
+    "compute_error_board_diag2": (NATIVE_BOARD_COL_DIAG, \
+        lambda input: native_expected_output_board_col_diag(input, expected_output_board_diag2(input), len(input[0]))),
+    "compute_error_is_magic": (NATIVE_IS_MAGIC, expected_output_is_magic),
+    "compute_error_is_sorted": (NATIVE_IS_SORTED, expected_output_is_sorted),
+}
+
+
+def get_function_name(raw_error_function):
+    return raw_error_function if type(raw_error_function) == type("") else raw_error_function[0]
+
+
+global g_raw_error_functions
+g_raw_error_functions = dict()
+
+
+def find_raw_error_function(function_name):
+    if function_name not in g_raw_error_functions:
+        g_raw_error_functions[function_name] = eval(function_name)
+    return g_raw_error_functions[function_name]
+
+
+def compute_raw_error_matrix(example_inputs, actual_outputs, raw_error_function, log_file, verbose, penalise_non_reacting_models, \
+        expected_outputs=None):
     if type(raw_error_function) == type(""):
         function_name, extra_function_params = raw_error_function, []
     else:
         function_name, extra_function_params = raw_error_function
-    raw_error_function = eval(function_name)
     if verbose >= 4:
         log_file.write(f"compute_error_matrix({function_name})\n")
     assert len(example_inputs) == len (actual_outputs)
-    domain_output_set = set()
-    for i, (example_input, actual_output) in enumerate(zip(example_inputs, actual_outputs)):
-        domain_output_set.add(recursive_tuple(actual_output))
-        raw_error_vector = raw_error_function(example_input, actual_output, extra_function_params, log_file, verbose)
-        raw_error_vector = np.array(raw_error_vector).astype(float)
-        if verbose >= 4:
+    native_evaluator = native_error_functions[function_name][0] if function_name in native_error_functions else None
+    if native_evaluator in [NATIVE_LIST_OF_INTS, NATIVE_WRAPPED_LIST_OF_INTS]:
+        if expected_outputs is None:
+            expected_outputs = get_expected_outputs(function_name, example_inputs)
+        if native_evaluator == NATIVE_WRAPPED_LIST_OF_INTS:
+            raw_error_matrix = compute_error_matrix_list_of_ints([[actual] for actual in actual_outputs], \
+                [[expect] for expect in expected_outputs])
+        else:
+            raw_error_matrix = compute_error_matrix_list_of_ints(actual_outputs, expected_outputs)
+    else:
+        raw_error_function = find_raw_error_function(function_name)
+        raw_error_matrix = np.array([raw_error_function(example_input, actual_output, extra_function_params, log_file, verbose) \
+            for example_input, actual_output in zip(example_inputs, actual_outputs)]).astype(float)
+    if verbose >= 4:
+        for example_input, actual_output, raw_error_vector in zip(example_inputs, actual_outputs, raw_error_matrix):
             msg = ""
             for x in raw_error_vector:
                 x = round(x)
@@ -600,10 +893,8 @@ def compute_raw_error_matrix(example_inputs, actual_outputs, raw_error_function,
                 else:
                     msg += "*"
             log_file.write(f"    {msg} = error(input={example_input}, output={actual_output})\n")
-        if i == 0:
-            raw_error_matrix = np.empty((len(example_inputs), raw_error_vector.shape[0]))
-        raw_error_matrix[i, :] = raw_error_vector
     if penalise_non_reacting_models:
+        domain_output_set = set([recursive_tuple(actual_output) for actual_output in actual_outputs])
         if len(domain_output_set) == 1:
             worst_raw_error_vector = find_worst_raw_error_vector(raw_error_matrix)
             raw_error_matrix[:] = worst_raw_error_vector
@@ -617,17 +908,17 @@ def compute_raw_error(raw_error_matrix):
     return float(np.sum(raw_error_matrix))
 
 
+def get_native_evaluator(raw_error_function):
+    function_name = get_function_name(raw_error_function)
+    if function_name not in native_error_functions:
+        raise RuntimeError(f"error function {function_name} has no native evaluator, see native_error_functions")
+    return native_error_functions[function_name][0]
+
+
 def get_expected_outputs(raw_error_function, example_inputs):
-    assert raw_error_function[0] in ["compute_error_merge_elem", "compute_error_merge_elema", "compute_error_merge_elemb"] # TODO : make more generic 
-    expected_outputs = []
-    for elem, data in example_inputs:
-        expect = data + [elem] 
-        expect.sort()
-        if raw_error_function[0] == "compute_error_merge_elema":
-            expect = expect[:-1]
-        elif raw_error_function[0] == "compute_error_merge_elemb":
-            expect = expect[-1]
-        expected_outputs.append(expect)
-    return expected_outputs
+    '''The expected outputs as the native evaluator of the error function uses them'''
+    get_native_evaluator(raw_error_function)
+    _, get_expected_output = native_error_functions[get_function_name(raw_error_function)]
+    return [get_expected_output(input) for input in example_inputs]
 
 
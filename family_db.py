@@ -0,0 +1,154 @@
+'''Binary family DB : per family the prefix-encoded code, the raw error matrix and the family keys.
+Read via mmap, so that a run gets its families without re-evaluating them.
+
+Layout, little endian :
+    header : magic, problem fingerprint (uint64), n_families, n_inputs, n_code_items (int64)
+    family_keys : uint64[n_families, 2], fingerprint of the outputs and of the error matrix, see cpp_coupling.compute_error_matrices
+    raw_error_matrices : float64[n_families, n_inputs, 8]
+    code_offsets : int64[n_families + 1], code of family i is code_items[code_offsets[i]:code_offsets[i+1]]
+    code_items : int32[n_code_items, 3], the _type, _value, _arity of cpp_coupling.CodeItem
+'''
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+from deap import gp
+
+import cpp_coupling
+import interpret
+from genome import Individual
+
+
+magic = b"FAMDB001"
+header_format = "<8sQqqq"
+header_size = struct.calcsize(header_format)
+error_vector_size = 8
+
+
+def compute_problem_fingerprint(toolbox):
+    '''The raw error matrices in a binary family DB are only valid for the same problem and evaluation settings'''
+    key = repr((toolbox.formal_params, toolbox.var_hints, toolbox.example_inputs, toolbox.native_evaluator, \
+        toolbox.expected_outputs, toolbox.penalise_non_reacting_models, toolbox.error_weights))
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "little")
+
+
+def get_item_decoder(toolbox):
+    '''Returns dict decoder[(_type, _value, _arity)] = primitive or terminal of toolbox.pset'''
+    symbol_table = toolbox.cpp_handle[2]
+    decoder = dict()
+    for item in toolbox.pset.mapping.values():
+        if isinstance(item, gp.Primitive):
+            if item.name in cpp_coupling.fcall_index:
+                index, arity = cpp_coupling.fcall_index[item.name]
+                decoder[(cpp_coupling.ITEM_FCALL, index, arity)] = item
+        elif type(item.value) == type(""):
+            decoder[(cpp_coupling.ITEM_VAR, symbol_table[item.value], 0)] = item
+        elif type(item.value) == type(1):
+            decoder[(cpp_coupling.ITEM_INT, item.value, 0)] = item
+    return decoder
+
+
+def decode_item(decoder, code_item):
+    code_item = tuple(code_item)
+    if code_item in decoder:
+        return decoder[code_item]
+    _type, value, _ = code_item
+    if _type == cpp_coupling.ITEM_INT:
+        return gp.Terminal(value, False, object) # same as gp.PrimitiveTree.from_string does for a constant not in the pset
+    raise RuntimeError(f"code item {code_item} is not in the primitive set")
+
+
+# ======================================== interface ================================================
+
+
+def is_binary_family_db(file_name):
+    with open(file_name, "rb") as f:
+        return f.read(len(magic)) == magic
+
+
+def write_family_db(file_name, toolbox, representatives):
+    '''Writes the families of the representatives.  The raw error matrices and the family keys are computed here'''
+    raw_error_matrices, _, family_keys = cpp_coupling.compute_error_matrices(toolbox.cpp_handle, representatives, \
+        toolbox.penalise_non_reacting_models)
+    code_items = np.concatenate([cpp_coupling.get_code(toolbox.cpp_handle, representative) for representative in representatives] \
+        + [np.empty((0, 3), dtype=np.int32)])
+    code_offsets = np.zeros(len(representatives) + 1, dtype=np.int64)
+    code_offsets[1:] = np.cumsum([len(representative) for representative in representatives])
+    header = struct.pack(header_format, magic, compute_problem_fingerprint(toolbox), len(representatives), \
+        raw_error_matrices.shape[1], len(code_items))
+    with open(file_name, "wb") as f:
+        f.write(header)
+        f.write(family_keys.astype("<u8").tobytes())
+        f.write(raw_error_matrices.astype("<f8").tobytes())
+        f.write(code_offsets.astype("<i8").tobytes())
+        f.write(code_items.astype("<i4").tobytes())
+
+
+def read_text_family_db(file_name, toolbox):
+    '''Yields the representatives of the families in a family DB in text format, one at a time'''
+    for code in interpret.compile_list_elements(file_name):
+        deap_str = interpret.convert_code_to_deap_str(code, toolbox)
+        yield Individual.from_string(deap_str, toolbox.pset)
+
+
+def get_shared_family_db(file_name, toolbox):
+    '''Returns the name of a binary family DB with the families of the text family DB file_name.  The first run
+    that needs it evaluates the families and writes it; concurrent runs on the same problem mmap the same file'''
+    with open(file_name, "rb") as f:
+        text_fingerprint = hashlib.sha1(f.read()).hexdigest()[:16]
+    binary_file_name = f"{file_name}.{text_fingerprint}.{compute_problem_fingerprint(toolbox):016x}.bin"
+    if not os.path.exists(binary_file_name):
+        tmp_file_name = f"{binary_file_name}.{os.getpid()}.tmp"
+        write_family_db(tmp_file_name, toolbox, list(read_text_family_db(file_name, toolbox)))
+        os.replace(tmp_file_name, binary_file_name) # atomic : other runs never see a partly written file
+    return binary_file_name
+
+
+def read_family_db(file_name, toolbox):
+    '''Yields (representative, raw_error_matrix, family_keys) per family.  The raw error matrices are read-only views
+    on a mmap of the file'''
+    with open(file_name, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    file_magic, problem_fingerprint, n_families, n_inputs, n_code_items = struct.unpack_from(header_format, buf, 0)
+    if file_magic != magic:
+        raise RuntimeError(f"{file_name} is not a binary family DB")
+    if problem_fingerprint != compute_problem_fingerprint(toolbox):
+        raise RuntimeError(f"{file_name} is written for another problem or with other evaluation settings")
+    offset = header_size
+    family_keys = np.frombuffer(buf, dtype="<u8", count=n_families * 2, offset=offset).reshape(n_families, 2)
+    offset += family_keys.nbytes
+    raw_error_matrices = np.frombuffer(buf, dtype="<f8", count=n_families * n_inputs * error_vector_size, offset=offset)
+    raw_error_matrices = raw_error_matrices.reshape(n_families, n_inputs, error_vector_size)
+    offset += raw_error_matrices.nbytes
+    code_offsets = np.frombuffer(buf, dtype="<i8", count=n_families + 1, offset=offset)
+    offset += code_offsets.nbytes
+    code_items = np.frombuffer(buf, dtype="<i4", count=n_code_items * 3, offset=offset).reshape(n_code_items, 3)
+    decoder = get_item_decoder(toolbox)
+    for i in range(n_families):
+        code = code_items[code_offsets[i]:code_offsets[i+1]]
+        representative = Individual([decode_item(decoder, code_item) for code_item in code.tolist()])
+        representative.code = code # read-only view on the mmap, code arrays are never changed in place
+        yield representative, raw_error_matrices[i], family_keys[i]
+
+
+if __name__ == "__main__":
+    # converter from the text format
+    if len(sys.argv) != 4:
+        exit(f"Usage: python family_db.py param_id text_family_db binary_family_db")
+    import find_new_function
+    param_id, text_file_name, binary_file_name = sys.argv[1:]
+    with open(f"experimenten/params_{param_id}.txt", "r") as f:
+        params = json.load(f)
+    functions = interpret.get_functions(params["functions_file"])
+    problems = interpret.compile(interpret.load(params["problems_file"]))
+    toolbox = find_new_function.Toolbox(problems[-1], functions, 0, 0)
+    toolbox.penalise_non_reacting_models = params["penalise_non_reacting_models"]
+    toolbox.error_weights = [params[w] for w in ["w1", "w2a", "w2b", "w3", "w4", "w5", "w6", "w7", "w8"]]
+    cpp_coupling.set_error_weights(toolbox.cpp_handle, toolbox.error_weights)
+    representatives = list(read_text_family_db(text_file_name, toolbox))
+    write_family_db(binary_file_name, toolbox, representatives)
+    print(f"{len(representatives)} families written to {binary_file_name}")
@@ -18,7 +18,9 @@ from evaluate import recursive_tuple
 import ga_search1
 import ga_search_tools
 import cpp_coupling
+import parallel_evaluation
 import graph
+from genome import Individual
 
 
 def f():
@@ -56,37 +58,45 @@ class Toolbox(object):
             functions[problem_name] = [formal_params, dummy_code]
         self.problem_name = problem_name
         self.formal_params = formal_params
+        self.var_hints = var_hints
         self.example_inputs = example_inputs
         self.error_function = error_function
         self.functions = functions
         self.pset = pset
         self.solution_code_str = interpret.convert_code_to_str(solution_hints) # for monkey test
         deap_str = interpret.convert_code_to_deap_str(solution_hints, self)
-        self.solution_deap_ind = gp.PrimitiveTree.from_string(deap_str, pset) # for finding shortest solution
+        self.solution_deap_ind = Individual.from_string(deap_str, pset) # for finding shortest solution
         if deap_str != str(self.solution_deap_ind):
             print("deap_str1", deap_str)
             print("deap_str2", str(self.solution_deap_ind))
             raise RuntimeError(f"Check if function hints '{str(func_hints)}' contain all functions of solution hint '{str(solution_hints)}'")
         self.expected_outputs = evaluate.get_expected_outputs(error_function, example_inputs)
         self.cpp_handle = cpp_coupling.get_cpp_handle(example_inputs, formal_params, var_hints, self.expected_outputs)
+        self.native_evaluator = evaluate.get_native_evaluator(error_function)
+        cpp_coupling.set_native_evaluator(self.cpp_handle, self.native_evaluator)
         self.random_seed = random_seed
         self.id_seed = id_seed
         self.eval_count = 0
         self.count_escape_missed_because_of_max_size = 0
         self.count_no_escape_missed_because_of_max_size = 0
+        self.verify_family_keys = False
+        self.pp_str_cache_size = 1000000
 
         self.reset()
  
 
     def reset(self):
         self.prev_best_raw_error_matrix = None
-        self.pp_str_to_family_index_dict = dict() # toolbox.pp_str_to_family_index_dict[pp_str] = family_index
+        self.pp_str_cache = ga_search_tools.PpStrCache(self.pp_str_cache_size) # toolbox.pp_str_cache.get(pp_str) = family_index
         self.families_list = []
         self.new_families_list = []
         self.near_solution_families_set = set()
-        self.families_dict = dict() # toolbox.families_dict[raw_error_matrix_tuple] = family_index
+        self.families_dict = dict() # toolbox.families_dict[family_key] = family_index, family_key is a 64 bit fingerprint
+        self.family_key_check_dict = dict() if self.verify_family_keys else None # toolbox.family_key_check_dict[family_key] = full key
         self.cx_count_dict = dict() # toolbox.cx_count_dict[(a_index, b_index)] = number of times a&b have cx'ed
         self.cx_child_dict = dict() # toolbox.cx_child_dict[(a_index, b_index)][c_index] += 1 each time a&b have got a c
+        self.current_families_dict = dict() # toolbox.current_families_dict[family_index] = the individuals of the family in the population
+        self.population_pp_strs = dict() # toolbox.population_pp_strs[ind.id] = pp_str, for the individuals in the population
         self.unique_id = 0
         self.escape_counter = 0
         self.graph = graph.Graph()
@@ -195,6 +205,7 @@ def initialise_toolbox(problem, functions, f, params):
     toolbox.good_muts_file = None # params["output_folder"] + "/goodmuts_" + str(id_seed) + ".txt"
     toolbox.bad_muts_file = None # params["output_folder"] + "/badmuts_" + str(id_seed) + ".txt"
     toolbox.fam_db_file = params["family_db_file"]
+    toolbox.share_family_db = params.get("share_family_db", False) # concurrent runs mmap one evaluated copy of a text family db
     toolbox.p_cx_c0_db_file = params["p_cx_c0_db_file"]
     toolbox.near_solution_families_file = params["output_folder"] + "/newfam_" + str(id_seed) + ".txt" # is added later to family DB
     toolbox.update_fam_db = params["update_family_db"]
@@ -210,15 +221,10 @@ def initialise_toolbox(problem, functions, f, params):
     toolbox.dynamic_weights = params["dynamic_weights"]
     toolbox.dynamic_weights_adaptation_speed = params["dynamic_weights_adaptation_speed"]
     toolbox.use_cprofile = params["use_cprofile"]
-    evaluate.g_w1 = params["w1"]
-    evaluate.g_w2a = params["w2a"]
-    evaluate.g_w2b = params["w2b"]
-    evaluate.g_w3 = params["w3"]
-    evaluate.g_w4 = params["w4"]
-    evaluate.g_w5 = params["w5"]
-    evaluate.g_w6 = params["w6"]
-    evaluate.g_w7 = params["w7"]
-    evaluate.g_w8 = params["w8"]
+    toolbox.error_weights = [params[w] for w in ["w1", "w2a", "w2b", "w3", "w4", "w5", "w6", "w7", "w8"]]
+    evaluate.g_w1, evaluate.g_w2a, evaluate.g_w2b, evaluate.g_w3, evaluate.g_w4, evaluate.g_w5, evaluate.g_w6, evaluate.g_w7, \
+        evaluate.g_w8 = toolbox.error_weights
+    cpp_coupling.set_error_weights(toolbox.cpp_handle, toolbox.error_weights)
     toolbox.stuck_count_for_opschudding = params["stuck_count_for_opschudding"]
     toolbox.max_reenter_parachuting_phase = params["max_reenter_parachuting_phase"]
     toolbox.family_key_is_error_matrix = params["family_key_is_error_matrix"]
@@ -239,6 +245,15 @@ def initialise_toolbox(problem, functions, f, params):
     toolbox.clear_representatives_after_reading_family_db = params["clear_representatives_after_reading_family_db"]
     toolbox.child_must_be_different = params["child_must_be_different"]
     toolbox.generation_may_degrade = params.get("generation_may_degrade", True)
+    toolbox.subtree_value_cache_size = params.get("subtree_value_cache_size", 100000)
+    cpp_coupling.set_subtree_value_cache_size(toolbox.cpp_handle, toolbox.subtree_value_cache_size)
+    toolbox.parallel_workers = params.get("parallel_workers", 0)
+    toolbox.parallel_batch_size = params.get("parallel_batch_size", 200)
+    toolbox.pool = parallel_evaluation.create_pool(toolbox)
+    toolbox.verify_family_keys = params.get("verify_family_keys", False) # debug mode : check for fingerprint collisions
+    toolbox.family_key_check_dict = dict() if toolbox.verify_family_keys else None
+    toolbox.pp_str_cache_size = params.get("pp_str_cache_size", 1000000) # max number of pp_strs with a known family
+    toolbox.pp_str_cache = ga_search_tools.PpStrCache(toolbox.pp_str_cache_size)
 
     if True:
         toolbox.f.write(f"expected_outputs {str(toolbox.expected_outputs)}\n")
@@ -250,5 +265,8 @@ def initialise_toolbox(problem, functions, f, params):
 
 def solve_by_new_function(problem, functions, f, params):
     toolbox = initialise_toolbox(problem, functions, f, params)
-    result = basinhopper(toolbox)
+    try:
+        result = basinhopper(toolbox)
+    finally:
+        parallel_evaluation.close_pool(toolbox.pool)
     return result
\ No newline at end of file
@@ -12,45 +12,68 @@ from deap import gp #  gp.PrimitiveSet, gp.genHalfAndHalf, gp.PrimitiveTree, gp.
 
 import interpret
 import evaluate
+import cpp_coupling
 from evaluate import recursive_tuple
 from ga_search_tools import write_population, consistency_check
 from ga_search_tools import best_of_n, generate_initial_population, generate_initial_population_impl
-from ga_search_tools import refresh_toolbox_from_population, write_cx_graph
+from ga_search_tools import refresh_toolbox_from_population, write_cx_graph, age_families, PpStrCache
 from ga_search_tools import load_initial_population_impl, evaluate_individual, consistency_check_ind
 from ga_search_tools import crossover_with_local_search, cxOnePoint, mutUniform, replace_subtree_at_best_location
-from ga_search_tools import compute_complementairity, pz, remove_file, get_fam_info, get_ind_info
-from ga_search_tools import forced_reevaluation_of_individual_for_debugging, copy_individual
+from ga_search_tools import compute_complementairities, pz, remove_file, get_fam_info, get_ind_info
+from ga_search_tools import forced_reevaluation_of_individual_for_debugging, copy_individual, replace_subtree
+from ga_search_tools import evaluate_individuals, write_cx_one_point_info, write_mut_uniform_info
 import dynamic_weights
+from genome import Individual
+
+
+def prepare_cx_fitness(toolbox):
+    '''Per generation : the raw error matrices of the current families stacked in one array, and their fitness.
+    Row i is family family_indices[i]; toolbox.current_family_positions[family_index] = i'''
+    family_indices = list(toolbox.current_families_dict)
+    toolbox.current_family_positions = {family_index : i for i, family_index in enumerate(family_indices)}
+    families = [toolbox.families_list[family_index] for family_index in family_indices]
+    toolbox.current_raw_error_matrices = np.array([fam.raw_error_matrix for fam in families])
+    toolbox.current_raw_errors = np.array([fam.raw_error for fam in families])
+    toolbox.current_p_fitness = 1 - toolbox.current_raw_errors / (toolbox.max_raw_error*1.1)
+    assert np.all((0 <= toolbox.current_p_fitness) & (toolbox.current_p_fitness <= 1))
+
+
+def compute_cx_fitnesses(toolbox, parent_pairs):
+    '''Returns the cx fitness of each (parent1, parent2) in parent_pairs, see prepare_cx_fitness'''
+    positions1 = [toolbox.current_family_positions[parent1.fam.family_index] for parent1, _ in parent_pairs]
+    positions2 = [toolbox.current_family_positions[parent2.fam.family_index] for _, parent2 in parent_pairs]
+    p_complementair = compute_complementairities(toolbox.current_raw_error_matrices[positions1], \
+        toolbox.current_raw_errors[positions1], toolbox.current_raw_error_matrices[positions2])
+    p = toolbox.current_p_fitness[positions1] * toolbox.current_p_fitness[positions2] + \
+        p_complementair * toolbox.parent_selection_weight_complementairity
+
+    # the cx counts change during the generation : looked up per pair
+    for k, (parent1, parent2) in enumerate(parent_pairs):
+        index_a, index_b = parent1.fam.family_index, parent2.fam.family_index
+        key = (index_a, index_b)
+        if key in toolbox.cx_count_dict:
+            count_cx = toolbox.cx_count_dict[key]
+        else:
+            count_cx = 0
+        if count_cx > 0:
+            x = count_cx + 1
+            y = toolbox.parent_selection_weight_cx_count
+            p[k] /= x ** y
+            x = pz(toolbox, parent1.fam.family_index, parent2.fam.family_index) 
+            y = toolbox.parent_selection_weight_p_out_of_pop
+            p[k] *= x ** y
+    assert np.all(p >= 0)
+    return p
+
+
+def sample_parents(family1_members, family2_members):
+    index1, index2 = random.randrange(0, len(family1_members)), random.randrange(0, len(family2_members))
+    return family1_members[index1], family2_members[index2]
 
 
 def sample_fam_cx_fitness(toolbox, family1_members, family2_members):
-    index1, index2 = random.randrange(0, len(family1_members)), random.randrange(0, len(family2_members))
-    parent1, parent2 = family1_members[index1], family2_members[index2]
-
-    # compute p        
-    p_fitness1 = (1 - parent1.fam.raw_error/(toolbox.max_raw_error*1.1))
-    p_fitness2 = (1 - parent2.fam.raw_error/(toolbox.max_raw_error*1.1))
-    assert 0 <= p_fitness1 and p_fitness1 <= 1
-    assert 0 <= p_fitness2 and p_fitness2 <= 1
-    p_complementair = compute_complementairity(parent1.fam, parent2.fam)
-
-    assert 0 <= p_complementair and p_complementair <= 1
-    p = ((p_fitness1 * p_fitness2)) + (p_complementair * toolbox.parent_selection_weight_complementairity)
-
-    index_a, index_b = parent1.fam.family_index, parent2.fam.family_index
-    key = (index_a, index_b)
-    if key in toolbox.cx_count_dict:
-        count_cx = toolbox.cx_count_dict[key]
-    else:
-        count_cx = 0
-    if count_cx > 0:
-        x = count_cx + 1
-        y = toolbox.parent_selection_weight_cx_count
-        p /= x ** y
-        x = pz(toolbox, parent1.fam.family_index, parent2.fam.family_index) 
-        y = toolbox.parent_selection_weight_p_out_of_pop
-        p *= x ** y
-    assert p >= 0
+    parent1, parent2 = sample_parents(family1_members, family2_members)
+    p = compute_cx_fitnesses(toolbox, [(parent1, parent2)])[0]
     return p, parent1, parent2
 
 
@@ -101,17 +124,15 @@ def select_parents(toolbox, population):
         best_parent1, best_parent2 = select_families_with_cx_count_zero(toolbox)
         if best_parent1:
             return best_parent1, best_parent2
-    best_p = -1
     assert toolbox.best_of_n_cx > 0
+    parent_pairs = []
     for _ in range(toolbox.best_of_n_cx):
         # select two parents
         family1_index, family2_index = random.sample(list(toolbox.current_families_dict), 2) # sample always returns a list
         family1_members, family2_members = toolbox.current_families_dict[family1_index], toolbox.current_families_dict[family2_index]
-        p, parent1, parent2 = sample_fam_cx_fitness(toolbox, family1_members, family2_members)
-        # keep the best couple
-        if best_p < p:
-            best_parent1, best_parent2, best_p = parent1, parent2, p
-    return best_parent1, best_parent2
+        parent_pairs.append(sample_parents(family1_members, family2_members))
+    # keep the best couple, the first one on ties
+    return parent_pairs[int(np.argmax(compute_cx_fitnesses(toolbox, parent_pairs)))]
 
 
 #global i5607804, i5756632, i5707508, i5292746
@@ -147,13 +168,15 @@ def search_for_solution(toolbox, population, cx_children):
             pass
 
     if len(cx_candidates) == 0:
+        parent_pairs = []
         for _, parents1 in toolbox.current_families_dict.items():
             for _, parents2 in toolbox.current_families_dict.items():
                 key = (parents1[0].fam.family_index, parents2[0].fam.family_index)
                 if key not in toolbox.cx_count_dict:
-                    parent1, parent2 = parents1[-1], parents2[-1]
-                    p = sample_fam_cx_fitness(toolbox, [parent1], [parent2])[0]
-                    cx_candidates.append((parent1, parent2, p))
+                    parent_pairs.append((parents1[-1], parents2[-1]))
+        if len(parent_pairs) > 0:
+            p = compute_cx_fitnesses(toolbox, parent_pairs)
+            cx_candidates = [(parent1, parent2, p[k]) for k, (parent1, parent2) in enumerate(parent_pairs)]
     cx_candidates.sort(key=lambda item: -item[2])
     for parent1, parent2, _ in cx_candidates:
         count += 1
@@ -168,6 +191,8 @@ def search_for_solution(toolbox, population, cx_children):
 def generate_offspring(toolbox, population, nchildren):
     offspring = []
     toolbox.max_raw_error = max([ind.fam.raw_error for ind in population])
+    if toolbox.parent_selection_strategy != 0:
+        prepare_cx_fitness(toolbox)
     toolbox.debug_pp_str = ""
     toolbox.offspring_families_set = set()
     for index, _inds in toolbox.current_families_dict.items():
@@ -189,7 +214,7 @@ def generate_offspring(toolbox, population, nchildren):
             toolbox.cx_count = dict()
             toolbox.cx_child_count = dict()
             if False:
-                toolbox.pp_str_to_family_index_dict = dict()
+                toolbox.pp_str_cache = PpStrCache(toolbox.pp_str_cache_size)
                 toolbox.family_list = []
                 toolbox.new_families_list = []
                 new_dict = dict()
@@ -211,18 +236,22 @@ def generate_offspring(toolbox, population, nchildren):
     expr_mut = lambda pset, type_: gp.genFull(pset=pset, min_=toolbox.mut_min_height, max_=toolbox.mut_max_height, type_=type_)
     retry_count = 0  
     prepare_combinations_families_with_cx_count_zero(toolbox, population)
+    pending = [] # the children of cxOnePoint and mutUniform are evaluated in one batch, after the loop
     while len(offspring) < nchildren:
         op_choice = random.random()
+        write_info = None
         if op_choice < toolbox.pcrossover and do_default_cx: # Apply crossover
             parent1, parent2 = select_parents(toolbox, population)
             if toolbox.parachute_level == 0:
                 child, pp_str = cxOnePoint(toolbox, parent1, parent2)
+                write_info = write_cx_one_point_info, (parent1, parent2)
             else:
                 child, pp_str = crossover_with_local_search(toolbox, parent1, parent2)
         else: # Apply mutation
             parent = best_of_n(population, toolbox.best_of_n_mut)
             if toolbox.parachute_level == 0:
-                child, pp_str = mutUniform(toolbox, parent, expr=expr_mut, pset=toolbox.pset)
+                child, pp_str, mutation = mutUniform(toolbox, parent, expr=expr_mut, pset=toolbox.pset)
+                write_info = write_mut_uniform_info, (parent, mutation)
             else:
                 if toolbox.use_family_representatives_for_mutation:
                     family = random.choice(toolbox.families_list)
@@ -230,7 +259,7 @@ def generate_offspring(toolbox, population, nchildren):
                     raise RuntimeError(f"DEBUG 228 : option use_family_representatives_for_mutation may not be used") # can be removed when debugging is done
                 else:
                     mutation = gp.genFull(pset=toolbox.pset, min_=toolbox.mut_min_height, max_=toolbox.mut_max_height)                
-                    mutation = gp.PrimitiveTree(mutation)                    
+                    mutation = Individual(mutation)
                     mutation.fam = None
                 if toolbox.use_crossover_for_mutations:
                     child, pp_str = crossover_with_local_search(toolbox, parent, mutation)
@@ -243,10 +272,17 @@ def generate_offspring(toolbox, population, nchildren):
             else:
                 break
         retry_count = 0
-        assert child.fam is not None
         toolbox.ind_str_set.add(pp_str)
-        toolbox.offspring_families_set.add(child.fam.family_index)
+        if write_info is None:
+            assert child.fam is not None
+            toolbox.offspring_families_set.add(child.fam.family_index)
+        else:
+            pending.append((child, pp_str, write_info))
         offspring.append(child)
+    evaluate_individuals(toolbox, [child for child, _, _ in pending], [pp_str for _, pp_str, _ in pending])
+    for child, _, (write_function, args) in pending:
+        write_function(toolbox, child, *args)
+        toolbox.offspring_families_set.add(child.fam.family_index)
     return offspring
 
 
@@ -279,6 +315,15 @@ def track_stuck(toolbox, population):
     toolbox.prev_family_index.add(population[0].fam.family_index)
 
 
+def select_population(toolbox, population, offspring, pop_size):
+    '''The first pop_size of population + offspring, sorted on toolbox.sort_ind_key.  A sorted population is one run for
+    the sort : then the sort comes down to sorting the offspring and merging them into the population'''
+    new_population = population + offspring
+    new_population.sort(key=toolbox.sort_ind_key)
+    del new_population[pop_size:]
+    return new_population
+
+
 def compute_generation_metric(population):
     assert len(population) > 0
     if True:
@@ -292,6 +337,11 @@ def log_info(toolbox, population):
     gen_metric = compute_generation_metric(population)
     msg = f"gen {toolbox.real_gen} pop0_error {population[0].fam.raw_error:.3f} gen_metric {gen_metric:.3f}"
     msg += f" cx40 count1 {toolbox.count_escape_missed_because_of_max_size} count2 {toolbox.count_no_escape_missed_because_of_max_size}"
+    hits, misses, _ = cpp_coupling.get_subtree_value_cache_counters(toolbox.cpp_handle)
+    msg += f" subtree_cache hits {hits} misses {misses}"
+    cache = toolbox.pp_str_cache
+    hit_rate = cache.hits / max(1, cache.hits + cache.misses)
+    msg += f" pp_str_cache hits {cache.hits} misses {cache.misses} hit_rate {hit_rate:.3f} size {len(cache)} evictions {cache.evictions}"
     toolbox.f.write(msg)
     if False:
         p_cx_c0 = 0.0
@@ -359,8 +409,7 @@ def ga_search_impl_core(toolbox):
         while toolbox.gen < toolbox.ngen[toolbox.parachute_level]:
             for ind in toolbox.population:
                 ind.age += 1
-            for fam in toolbox.families_list:
-                fam.age += 1
+            age_families()
             track_stuck(toolbox, toolbox.population)
             if toolbox.f and toolbox.verbose >= 1:
                 log_info(toolbox, toolbox.population)
@@ -375,7 +424,7 @@ def ga_search_impl_core(toolbox):
             if fraction < 1:
                 new_population = random.sample(toolbox.population, k=int(len(toolbox.population)*fraction))
             else:
-                new_population = [ind for ind in toolbox.population]
+                new_population = toolbox.population # sorted by refresh_toolbox_from_population
             if toolbox.in_near_solution_area:
                 # trim families
                 new_population = []
@@ -385,11 +434,9 @@ def ga_search_impl_core(toolbox):
                     if rep is not None:
                         slice_ind = ind.searchSubtree(0)
                         slice_rep = rep.searchSubtree(0)
-                        ind[slice_ind] = rep[slice_rep]
+                        replace_subtree(toolbox, ind, slice_ind, rep, slice_rep)
                         new_population.append(ind)
-            new_population += offspring
-            new_population.sort(key=toolbox.sort_ind_key)
-            new_population[:] = new_population[:toolbox.pop_size[toolbox.parachute_level]]
+            new_population = select_population(toolbox, new_population, offspring, toolbox.pop_size[toolbox.parachute_level])
             if toolbox.generation_may_degrade or not does_generation_degrade(toolbox.population, new_population):
                 if toolbox.population[0].fam.raw_error > new_population[0].fam.raw_error:
                     toolbox.count_escape_missed_because_of_max_size = 0
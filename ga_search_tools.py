@@ -3,6 +3,7 @@
 import os
 import random
 import copy
+import collections
 import math
 import time
 import json
@@ -14,6 +15,9 @@ import evaluate
 import dynamic_weights
 from evaluate import recursive_tuple
 import cpp_coupling
+import parallel_evaluation
+import family_db
+from genome import Individual, get_subtree_ends, splice_subtree_ends
 
 from deap import gp #  gp.PrimitiveSet, gp.genHalfAndHalf, gp.PrimitiveTree, gp.genFull, gp.from_string
 
@@ -54,18 +58,40 @@ def test_against_python_interpreter(toolbox, cpp_model_outputs, ind):
     assert py_model_outputs == cpp_model_outputs
 
 
+global g_family_clock
+g_family_clock = 0 # number of generations, see age_families
+
+
 class Family:
     def __init__(self, family_index, raw_error_matrix, representative):
         self.family_index = family_index
         self.raw_error_matrix = raw_error_matrix
         self.raw_error = evaluate.compute_raw_error(self.raw_error_matrix)
         self.representative = representative
-        self.age = 0
-        self.age_in_population = 0
-        self.update_normalised_error()
+        self.birth = g_family_clock
+        self.age_in_population = 0 # maintained by refresh_toolbox_from_population
+        self.normalised_error_epoch = None
+
+    @property
+    def age(self):
+        return g_family_clock - self.birth
+
+    @property
+    def normalised_error(self):
+        '''Computed on first use after a change of the dynamic weights'''
+        if self.normalised_error_epoch != dynamic_weights.weights_epoch:
+            self.update_normalised_error()
+        return self._normalised_error
 
     def update_normalised_error(self):
-        self.normalised_error = dynamic_weights.compute_normalised_error(self.raw_error_matrix, 1.0)
+        self._normalised_error = dynamic_weights.compute_normalised_error(self.raw_error_matrix, 1.0)
+        self.normalised_error_epoch = dynamic_weights.weights_epoch
+
+
+def age_families():
+    '''All families get one generation older, without visiting them'''
+    global g_family_clock
+    g_family_clock += 1
 
 
 def forced_reevaluation_of_individual_for_debugging(toolbox, ind, debug_level):
@@ -73,7 +99,7 @@ def forced_reevaluation_of_individual_for_debugging(toolbox, ind, debug_level):
     cpp_model_outputs = cpp_coupling.run_on_all_inputs(toolbox.cpp_handle, ind)
     test_against_python_interpreter(toolbox, cpp_model_outputs, ind)
     raw_error_matrix = evaluate.compute_raw_error_matrix(toolbox.example_inputs, cpp_model_outputs, toolbox.error_function, \
-        toolbox.f, debug_level, False)
+        toolbox.f, debug_level, False, toolbox.expected_outputs)
     raw_error = evaluate.compute_raw_error(raw_error_matrix)
     return raw_error
 
@@ -90,11 +116,14 @@ def check_error_matrices(raw_error_matrix_py, raw_error_matrix_cpp):
             assert math.isclose(raw_error_matrix_py[i, j], raw_error_matrix_cpp[i, j])
 
 
-def evaluate_individual_impl(toolbox, ind, debug=0):
-    if True:
+def evaluate_individual_impl(toolbox, ind, debug=0, precomputed=None):
+    if precomputed is not None:
+        # computed by a worker process, see evaluate_individuals
+        raw_error_matrix, family_key = precomputed
+    elif True:
         # cpp interpretatie en evaluatie
         raw_error_matrix, family_key = cpp_coupling.compute_error_matrix(toolbox.cpp_handle, ind, \
-            toolbox.penalise_non_reacting_models, toolbox.families_dict, toolbox.family_key_is_error_matrix)
+            toolbox.penalise_non_reacting_models, toolbox.family_key_is_error_matrix)
     else:
         if False:
             # cpp interpretatie
@@ -111,7 +140,11 @@ def evaluate_individual_impl(toolbox, ind, debug=0):
         # python evaluatie
         if family_key not in toolbox.families_dict:
             raw_error_matrix = evaluate.compute_raw_error_matrix(toolbox.example_inputs, model_outputs, toolbox.error_function, \
-                toolbox.f,toolbox.verbose, toolbox.penalise_non_reacting_models)
+                toolbox.f,toolbox.verbose, toolbox.penalise_non_reacting_models, toolbox.expected_outputs)
+
+    if toolbox.family_key_check_dict is not None and raw_error_matrix is not None:
+        cpp_coupling.check_family_key(toolbox.cpp_handle, ind, raw_error_matrix, family_key, toolbox.family_key_is_error_matrix, \
+            toolbox.family_key_check_dict)
 
     # bepaling family
     if family_key in toolbox.families_dict:
@@ -134,21 +167,75 @@ def evaluate_individual_impl(toolbox, ind, debug=0):
         if False:
             model_outputs_py = cpp_coupling.run_on_all_inputs(toolbox.cpp_handle, ind)
             raw_error_matrix_py = evaluate.compute_raw_error_matrix(toolbox.example_inputs, model_outputs_py, toolbox.error_function, \
-                toolbox.f, debug, toolbox.penalise_non_reacting_models)
+                toolbox.f, debug, toolbox.penalise_non_reacting_models, toolbox.expected_outputs)
             check_error_matrices(raw_error_matrix_py, raw_error_matrix)
 
 
 
-def evaluate_individual(toolbox, individual, pp_str, debug):
+class PpStrCache:
+    '''Bounded memo pp_str -> family index, least recently used evicted first.  Keyed by the 64 bit hash of the pp_str
+    instead of the pp_str itself.  An evicted pp_str is evaluated again, and gets the same family'''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.family_indices = collections.OrderedDict() # family_indices[hash(pp_str)] = family_index, most recently used last
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def __contains__(self, pp_str):
+        return hash(pp_str) in self.family_indices
+
+    def __len__(self):
+        return len(self.family_indices)
+
+    def get(self, pp_str):
+        '''Returns the family index of pp_str, or None when unknown'''
+        key = hash(pp_str)
+        family_index = self.family_indices.get(key)
+        if family_index is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.family_indices.move_to_end(key)
+        return family_index
+
+    def add(self, pp_str, family_index):
+        key = hash(pp_str)
+        self.family_indices[key] = family_index
+        self.family_indices.move_to_end(key)
+        if len(self.family_indices) > self.max_size:
+            self.family_indices.popitem(last=False)
+            self.evictions += 1
+
+
+def evaluate_individual(toolbox, individual, pp_str, debug, precomputed=None):
     assert type(pp_str) == type("") and type(debug) == type(1)
-    if pp_str in toolbox.pp_str_to_family_index_dict:
-        family_index = toolbox.pp_str_to_family_index_dict[pp_str]
+    family_index = toolbox.pp_str_cache.get(pp_str)
+    if family_index is not None:
         individual.fam = toolbox.families_list[family_index]
     else:
         if len(individual) <= toolbox.max_individual_size:
             toolbox.eval_count += 1
-        evaluate_individual_impl(toolbox, individual, debug)
-        toolbox.pp_str_to_family_index_dict[pp_str] = individual.fam.family_index
+        evaluate_individual_impl(toolbox, individual, debug, precomputed)
+        toolbox.pp_str_cache.add(pp_str, individual.fam.family_index)
+
+
+def evaluate_individuals(toolbox, individuals, pp_strs):
+    '''Same result as calling evaluate_individual on each individual in turn.  With a worker pool,
+    the C++ interpretation and evaluation of the unknown individuals is done by the workers.'''
+    precomputed = dict()
+    if toolbox.pool is not None:
+        todo = []
+        for pp_str in pp_strs:
+            if pp_str not in toolbox.pp_str_cache and pp_str not in precomputed:
+                precomputed[pp_str] = None
+                todo.append(pp_str)
+        if len(todo) > toolbox.parallel_batch_size:
+            results = parallel_evaluation.evaluate_pp_strs_in_parallel(toolbox.pool, todo, toolbox.parallel_batch_size)
+            precomputed = dict(zip(todo, results))
+        else:
+            precomputed = dict() # too few for the overhead of the workers
+    # family indices are assigned here, in the order of the individuals: reproducible family numbering
+    for ind, pp_str in zip(individuals, pp_strs):
+        evaluate_individual(toolbox, ind, pp_str, 0, precomputed.get(pp_str))
 
 
 def best_of_n(population, n):
@@ -182,6 +269,14 @@ def compute_complementairity(fam1, fam2):
     return complementairity
 
 
+def compute_complementairities(raw_error_matrices1, raw_errors1, raw_error_matrices2):
+    '''compute_complementairity of all pairs (raw_error_matrices1[k], raw_error_matrices2[k]) at once'''
+    raw_improvements = raw_error_matrices1 - raw_error_matrices2
+    complementairities = np.sum(np.maximum(raw_improvements, 0), axis=(1, 2)) / raw_errors1
+    assert np.all(complementairities >= 0)
+    return np.minimum(complementairities, 1) # max complementairity is that the whole parent1.fam.raw_error is removed
+
+
 def pz(toolbox, index_a, index_b):
     count_in_pop, count_out_pop = 0, 0
     if (index_a, index_b) in toolbox.cx_child_dict:
@@ -278,7 +373,7 @@ def generate_initial_population_impl(toolbox):
     population = []
     retry_count = 0
     while len(population) < toolbox.pop_size[0]:
-        ind = gp.PrimitiveTree(gp.genHalfAndHalf(pset=toolbox.pset, min_=2, max_=4))
+        ind = Individual(gp.genHalfAndHalf(pset=toolbox.pset, min_=2, max_=4))
         ind.age = 0
         ind.id = toolbox.get_unique_id()
         pp_str = make_pp_str(ind)
@@ -363,7 +458,7 @@ def load_initial_population_impl(toolbox, old_pops):
                 else:
                     # old_pop is list of lists/ints/strings making 
                     deap_str = interpret.convert_code_to_deap_str(code, toolbox)
-                    ind = gp.PrimitiveTree.from_string(deap_str, toolbox.pset)                    
+                    ind = Individual.from_string(deap_str, toolbox.pset)                    
                     ind.age = 0
                     ind.id = toolbox.get_unique_id()
                     assert deap_str == str(ind)
@@ -433,7 +528,7 @@ def analyse_vastlopers_via_best_files_no_family_db(toolbox):
                 assert len(best_list) == 1
                 code = best_list[0]
                 deap_str = interpret.convert_code_to_deap_str(code, toolbox)
-                ind = gp.PrimitiveTree.from_string(deap_str, toolbox.pset)                    
+                ind = Individual.from_string(deap_str, toolbox.pset)                    
                 ind.age = 0
                 ind.id = toolbox.get_unique_id()
                 pp_str = make_pp_str(ind)
@@ -519,22 +614,31 @@ def read_p_cx_c0_db(toolbox):
                 toolbox.p_family_in_cx_c0_db[index] = max(toolbox.p_family_in_cx_c0_db[index], p_cx_c0)
 
 
+def iterate_family_db(toolbox):
+    '''Yields (ind, precomputed) for each family in the family db, see evaluate_individual'''
+    fam_db_file = toolbox.fam_db_file
+    if toolbox.share_family_db and not family_db.is_binary_family_db(fam_db_file):
+        fam_db_file = family_db.get_shared_family_db(fam_db_file, toolbox)
+    if family_db.is_binary_family_db(fam_db_file):
+        # no re-evaluation : the raw error matrices and family keys are in the db
+        for ind, raw_error_matrix, family_keys in family_db.read_family_db(fam_db_file, toolbox):
+            family_key = cpp_coupling.select_family_key(raw_error_matrix, family_keys, toolbox.family_key_is_error_matrix)
+            yield ind, (raw_error_matrix, family_key)
+    else:
+        for ind in family_db.read_text_family_db(fam_db_file, toolbox): # one family at a time
+            yield ind, None
+
+
 def read_family_db(toolbox):
     # toolbox.f.write("reading families db, please have some patience\n")
     if toolbox.update_fam_db or toolbox.analyse_best or toolbox.compute_p_cx_c0:
         print(f"reading families db in {toolbox.fam_db_file} ...")
         t0 = time.time()
-    families = interpret.compile(interpret.load(toolbox.fam_db_file))
-    if toolbox.update_fam_db or toolbox.analyse_best or toolbox.compute_p_cx_c0:
-        print(f"    {round(time.time() - t0)} seconds for reading {len(families)} families")
-        t0 = time.time()
-    for code in families:
-        deap_str = interpret.convert_code_to_deap_str(code, toolbox)
-        ind = gp.PrimitiveTree.from_string(deap_str, toolbox.pset)                    
+    for ind, precomputed in iterate_family_db(toolbox):
         ind.age = 0
         ind.id = toolbox.get_unique_id()
         pp_str = make_pp_str(ind)
-        evaluate_individual(toolbox, ind, pp_str, 0)
+        evaluate_individual(toolbox, ind, pp_str, 0, precomputed)
         if toolbox.clear_representatives_after_reading_family_db:
             # Prevent that the extra short DB snippets will influence the search : remove the code
             ind.fam.representative = None # only the family NUMBER may be used
@@ -542,7 +646,7 @@ def read_family_db(toolbox):
     if toolbox.update_fam_db or toolbox.analyse_best or toolbox.compute_p_cx_c0:
         elapsed = round(time.time() - t0)
         if elapsed > 0:
-            print(f"    {elapsed} seconds for processing, {round(len(toolbox.families_list)/elapsed)} families/sec")
+            print(f"    {elapsed} seconds for reading and processing, {round(len(toolbox.families_list)/elapsed)} families/sec")
     toolbox.t0 = time.time() # discard time lost by reading in the family db
 
 
@@ -556,14 +660,17 @@ def update_fams(toolbox, newfams_list):
             print("    progress", i, "/", len(newfams_list))
         for representative in newfams:
             deap_str = interpret.convert_code_to_deap_str(representative, toolbox)
-            representative = gp.PrimitiveTree.from_string(deap_str, toolbox.pset)
+            representative = Individual.from_string(deap_str, toolbox.pset)
             representative.age = 0
             representative.id = toolbox.get_unique_id()
             pp_str = make_pp_str(representative)
             evaluate_individual(toolbox, representative, pp_str, 0)
     all_families = [family.representative for family in toolbox.families_list if family.raw_error <= toolbox.max_raw_error_for_family_db]
     all_families.sort(key=lambda item: item.fam.raw_error)
-    write_population(toolbox.fam_db_file + ".update", all_families, toolbox.functions)
+    if family_db.is_binary_family_db(toolbox.fam_db_file):
+        family_db.write_family_db(toolbox.fam_db_file + ".update", toolbox, all_families)
+    else:
+        write_population(toolbox.fam_db_file + ".update", all_families, toolbox.functions)
     len_at_end = len(toolbox.families_list)
     print(f"    {len_at_end - len_at_start} new families added to the db.  Total now {len_at_end}.")
 
@@ -603,13 +710,25 @@ def generate_initial_population(toolbox, old_pops=None):
 
 
 def copy_individual(toolbox, ind):
-    copy_ind = gp.PrimitiveTree(list(ind[:]))
+    copy_ind = Individual(ind)
+    copy_ind.code = cpp_coupling.get_code(toolbox.cpp_handle, ind) # shared, code arrays are never changed in place
+    copy_ind.ends = get_subtree_ends(ind) # shared too
     copy_ind.fam = ind.fam
     copy_ind.age = 0
     copy_ind.id = toolbox.get_unique_id()
     return copy_ind
 
 
+def replace_subtree(toolbox, ind, slice_, source, source_slice):
+    '''ind[slice_] = source[source_slice], with the code and subtree ends of ind derived from those of ind and source'''
+    code, ends = cpp_coupling.get_code(toolbox.cpp_handle, ind), get_subtree_ends(ind)
+    source_code = cpp_coupling.get_code(toolbox.cpp_handle, source)[source_slice]
+    source_ends = get_subtree_ends(source)[source_slice]
+    ind[slice_] = source[source_slice]
+    ind.code = np.concatenate((code[:slice_.start], source_code, code[slice_.stop:]))
+    ind.ends = splice_subtree_ends(ends, slice_, source_ends, source_slice.start)
+
+
 def cxOnePoint(toolbox, parent1, parent2):
     if len(parent1) < 2 or len(parent2) < 2:
         # No crossover on single node tree
@@ -619,25 +738,73 @@ def cxOnePoint(toolbox, parent1, parent2):
     index2 = random.randrange(0, len(parent2))
     slice1 = parent1.searchSubtree(index1)
     slice2 = parent2.searchSubtree(index2)
-    child[slice1] = parent2[slice2]
+    replace_subtree(toolbox, child, slice1, parent2, slice2)
     pp_str = make_pp_str(child)
     if pp_str in toolbox.ind_str_set or len(child) > toolbox.max_individual_size:
         return None, None
-    evaluate_individual(toolbox, child, pp_str, 0)
-    if child:
-        f1, f2 = parent1.fam.family_index, parent2.fam.family_index
-        toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {get_ind_info(child)} = cx [{parent1.id}]<{f1}> [{parent2.id}]<{f2}>\n")
-        toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {str(child)}\n")
+    # the child is evaluated later, together with the other offspring, see generate_offspring
     return child, pp_str
 
 
+def write_cx_one_point_info(toolbox, child, parent1, parent2):
+    f1, f2 = parent1.fam.family_index, parent2.fam.family_index
+    toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {get_ind_info(child)} = cx [{parent1.id}]<{f1}> [{parent2.id}]<{f2}>\n")
+    toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {str(child)}\n")
+
+
 def is_improvement(toolbox, ind, best):
+    return is_improvement_impl(toolbox, ind.fam, len(ind), best)
+
+
+def is_improvement_impl(toolbox, fam, size, best):
     if best is None:
         return True
-    if best.fam.normalised_error != ind.fam.normalised_error:
-        return best.fam.normalised_error > ind.fam.normalised_error
+    if best.fam.normalised_error != fam.normalised_error:
+        return best.fam.normalised_error > fam.normalised_error
     # now they have equal .normalised_error
-    return len(best) > len(ind)
+    return len(best) > size
+
+
+def make_splice(toolbox, parent1, parent2, ends1, ends2, index1, index2):
+    child = copy_individual(toolbox, parent1)
+    replace_subtree(toolbox, child, slice(index1, ends1[index1]), parent2, slice(index2, ends2[index2]))
+    return child
+
+
+def evaluate_splices(toolbox, parent1, parent2, ends1, ends2, splices, pp_strs):
+    '''Same as evaluate_individuals on the children of the splices, but the unknown children are made and evaluated in
+    C++ in one call.  Only children with an unknown pp_str are made in python : they may represent their family.
+    Returns the families of the children, and the children that are made (None for the others)'''
+    precomputed = dict()
+    todo, todo_splices = [], []
+    for splice, pp_str in zip(splices, pp_strs):
+        if pp_str not in toolbox.pp_str_cache and pp_str not in precomputed:
+            precomputed[pp_str] = None
+            todo.append(pp_str)
+            todo_splices.append(splice)
+    if toolbox.pool is not None and len(todo) > toolbox.parallel_batch_size:
+        results = parallel_evaluation.evaluate_pp_strs_in_parallel(toolbox.pool, todo, toolbox.parallel_batch_size)
+    else:
+        raw_error_matrices, _, family_keys = cpp_coupling.compute_error_matrices_of_splices(toolbox.cpp_handle, parent1, parent2, \
+            todo_splices, toolbox.penalise_non_reacting_models)
+        results = []
+        for raw_error_matrix, keys in zip(raw_error_matrices, family_keys):
+            raw_error_matrix = raw_error_matrix.copy() # a family must not keep the whole batch alive
+            results.append((raw_error_matrix, cpp_coupling.select_family_key(raw_error_matrix, keys, toolbox.family_key_is_error_matrix)))
+    precomputed = dict(zip(todo, results))
+    # family indices are assigned here, in the order of the splices: reproducible family numbering
+    families, children = [], []
+    for (index1, index2), pp_str in zip(splices, pp_strs):
+        child = None
+        if pp_str not in toolbox.pp_str_cache:
+            child = make_splice(toolbox, parent1, parent2, ends1, ends2, index1, index2)
+            # not precomputed when it was evicted from the pp_str cache after the todo list was made
+            evaluate_individual(toolbox, child, pp_str, 0, precomputed.get(pp_str))
+            families.append(child.fam)
+        else:
+            families.append(toolbox.families_list[toolbox.pp_str_cache.get(pp_str)])
+        children.append(child)
+    return families, children
 
 
 global debug_index1, debug_index2
@@ -655,29 +822,33 @@ def crossover_with_local_search(toolbox, parent1, parent2, do_shuffle=True, debu
         random.shuffle(indexes1)
         random.shuffle(indexes2)
     best, best_pp_str = None, None
+    # the children are spliced as pp_strs; only the children that need a tree are made as gp.PrimitiveTree
+    names1, names2 = [x.name for x in parent1], [x.name for x in parent2]
+    ends1, ends2 = get_subtree_ends(parent1), get_subtree_ends(parent2)
+    splices, pp_strs, sizes = [], [], []
     for index2 in indexes2:
-        slice2 = parent2.searchSubtree(index2)
-        expr2 = parent2[slice2]
+        expr2 = names2[index2:ends2[index2]]
         for index1 in indexes1:
-            child = copy_individual(toolbox, parent1)
-            slice1 = child.searchSubtree(index1)
-            child[slice1] = expr2
-            if len(child) <= toolbox.max_individual_size:
-                pp_str = make_pp_str(child)
-                if pp_str not in toolbox.ind_str_set:
-                    evaluate_individual(toolbox, child, pp_str, 0)
-                    if not toolbox.in_near_solution_area or child.fam.family_index not in toolbox.offspring_families_set:
-                        if not toolbox.child_must_be_different or child.fam.family_index != parent1.fam.family_index:
-                            if is_improvement(toolbox, child, best):
-                                best, best_pp_str = child, pp_str
+            pp_str = " ".join(names1[:index1] + expr2 + names1[ends1[index1]:])
+            if pp_str not in toolbox.ind_str_set:
+                splices.append((index1, index2))
+                pp_strs.append(pp_str)
+                sizes.append(len(parent1) - (ends1[index1] - index1) + len(expr2))
+    families, children = evaluate_splices(toolbox, parent1, parent2, ends1, ends2, splices, pp_strs)
+    for (index1, index2), pp_str, size, fam, child in zip(splices, pp_strs, sizes, families, children):
+        if size <= toolbox.max_individual_size:
+            if not toolbox.in_near_solution_area or fam.family_index not in toolbox.offspring_families_set:
+                if not toolbox.child_must_be_different or fam.family_index != parent1.fam.family_index:
+                    if is_improvement_impl(toolbox, fam, size, best):
+                        if child is None:
+                            child = make_splice(toolbox, parent1, parent2, ends1, ends2, index1, index2)
+                            child.fam = fam
+                        best, best_pp_str = child, pp_str
+        else:
+            if fam.raw_error < toolbox.population[0].fam.raw_error:
+                toolbox.count_escape_missed_because_of_max_size += 1
             else:
-                pp_str = make_pp_str(child)
-                if pp_str not in toolbox.ind_str_set:
-                    evaluate_individual(toolbox, child, pp_str, 0)
-                    if child.fam.raw_error < toolbox.population[0].fam.raw_error:
-                        toolbox.count_escape_missed_because_of_max_size += 1
-                    else:
-                        toolbox.count_no_escape_missed_because_of_max_size += 1
+                toolbox.count_no_escape_missed_because_of_max_size += 1
 
 
     # cx_count administration
@@ -704,7 +875,7 @@ def crossover_with_local_search(toolbox, parent1, parent2, do_shuffle=True, debu
         if repr is not None:
             slice_best = best.searchSubtree(0)
             slice_repr = repr.searchSubtree(0)
-            best[slice_best] = repr[slice_repr]
+            replace_subtree(toolbox, best, slice_best, repr, slice_repr)
 
     # near solution debugging
     if best and toolbox.in_near_solution_area and best.fam.raw_error <= toolbox.max_raw_error_for_family_db:
@@ -744,20 +915,22 @@ def mutUniform(toolbox, parent, expr, pset):
     index = random.randrange(0, len(child))
     slice_ = child.searchSubtree(index)
     type_ = child[index].ret
-    mutation = expr(pset=pset, type_=type_)
-    child[slice_] = mutation
+    mutation = Individual(expr(pset=pset, type_=type_))
+    replace_subtree(toolbox, child, slice_, mutation, slice(0, len(mutation)))
     pp_str = make_pp_str(child)
     if pp_str in toolbox.ind_str_set or len(child) > toolbox.max_individual_size:
-        return None, None
-    evaluate_individual(toolbox, child, pp_str, 0)
-    if child:
-        mutation =  gp.PrimitiveTree(mutation)                    
-        expr_str = str(mutation)
-        f1 = parent.fam.family_index
-        toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {get_ind_info(child)} = mut [{parent.id}]<{f1}>\n")
-        toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = mut expr {expr_str}\n")
-        toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {str(child)}\n")
-    return child, pp_str
+        return None, None, None
+    # the child is evaluated later, together with the other offspring, see generate_offspring
+    return child, pp_str, mutation
+
+
+def write_mut_uniform_info(toolbox, child, parent, mutation):
+    mutation =  gp.PrimitiveTree(mutation)                    
+    expr_str = str(mutation)
+    f1 = parent.fam.family_index
+    toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {get_ind_info(child)} = mut [{parent.id}]<{f1}>\n")
+    toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = mut expr {expr_str}\n")
+    toolbox.f.write(f"at gen {toolbox.real_gen}, [{child.id}] = {str(child)}\n")
 
 
 def replace_subtree_at_best_location(toolbox, parent, expr):
@@ -766,24 +939,32 @@ def replace_subtree_at_best_location(toolbox, parent, expr):
     n = int(toolbox.mut_local_search * len(indexes))
     indexes = indexes[:n]
     best = None
+    names, expr_names = [x.name for x in parent], [x.name for x in expr]
+    ends, expr_ends = get_subtree_ends(parent), get_subtree_ends(expr)
+    splices, pp_strs, sizes = [], [], []
     for index in indexes:
-        child = copy_individual(toolbox, parent)
-        slice1 = child.searchSubtree(index)
-        child[slice1] = expr
-        if len(child) <= toolbox.max_individual_size:
-            pp_str = make_pp_str(child)
+        size = len(parent) - (ends[index] - index) + len(expr)
+        if size <= toolbox.max_individual_size:
+            pp_str = " ".join(names[:index] + expr_names + names[ends[index]:])
             if pp_str not in toolbox.ind_str_set:
-                evaluate_individual(toolbox, child, pp_str, 0)
-                if not toolbox.in_near_solution_area or child.fam.family_index not in toolbox.offspring_families_set:                    
-                    if not toolbox.child_must_be_different or child.fam.family_index != parent.fam.family_index:
-                        if is_improvement(toolbox, child, best):                        
-                            best = child
+                splices.append((index, 0))
+                pp_strs.append(pp_str)
+                sizes.append(size)
+    families, children = evaluate_splices(toolbox, parent, expr, ends, expr_ends, splices, pp_strs)
+    for (index, _), size, fam, child in zip(splices, sizes, families, children):
+        if not toolbox.in_near_solution_area or fam.family_index not in toolbox.offspring_families_set:                    
+            if not toolbox.child_must_be_different or fam.family_index != parent.fam.family_index:
+                if is_improvement_impl(toolbox, fam, size, best):                        
+                    if child is None:
+                        child = make_splice(toolbox, parent, expr, ends, expr_ends, index, 0)
+                        child.fam = fam
+                    best = child
     if best and toolbox.in_near_solution_area:
         repr = best.fam.representative
         if repr is not None:
             slice_best = best.searchSubtree(0)
             slice_repr = repr.searchSubtree(0)
-            best[slice_best] = repr[slice_repr]
+            replace_subtree(toolbox, best, slice_best, repr, slice_repr)
 
     pp_str = None if best is None else make_pp_str(best) 
     if best:        
@@ -830,36 +1011,39 @@ def refresh_toolbox_from_population(toolbox, population, population_is_sorted):
     if not population_is_sorted:
         # population.sort(key=toolbox.sort_ind_key) # influences reproducability with older runs
         pass
-    toolbox.ind_str_set = {make_pp_str(ind) for ind in population} # refresh set after deletion of non-fit individuals
-    toolbox.current_families_dict = dict()
+    # only the individuals that are new in the population get their pp_str made
+    population_pp_strs = dict()
+    for ind in population:
+        pp_str = toolbox.population_pp_strs.get(ind.id)
+        population_pp_strs[ind.id] = pp_str if pp_str is not None else make_pp_str(ind)
+    toolbox.population_pp_strs = population_pp_strs
+    toolbox.ind_str_set = set(population_pp_strs.values()) # refresh set after deletion of non-fit individuals
+    prev_families_dict = toolbox.current_families_dict
+    toolbox.current_families_dict = dict() # in population order : reproducible parent selection
     for ind in population:
         family_index = ind.fam.family_index        
         if family_index not in toolbox.current_families_dict:
             toolbox.current_families_dict[family_index] = []
         toolbox.current_families_dict[family_index].append(ind)
-    for fam in toolbox.families_list:
-        if fam.family_index in toolbox.current_families_dict:
-            fam.age_in_population += 1
-        else:
-            fam.age_in_population = 0
+    # families outside the population have age_in_population 0, so only the families that leave or are in the population change
+    for family_index in prev_families_dict:
+        if family_index not in toolbox.current_families_dict:
+            toolbox.families_list[family_index].age_in_population = 0
+    for family_index in toolbox.current_families_dict:
+        toolbox.families_list[family_index].age_in_population += 1
     if toolbox.dynamic_weights:
         raw_error_matrix_list = []
-        if False:
-            for index, _ in toolbox.current_families_dict.items():
-                family = toolbox.families_list[index]
-                raw_error_matrix_list.append(family.raw_error_matrix)
-        else:
-            for family in toolbox.families_list:
-                raw_error_matrix_list.append(family.raw_error_matrix)
+        for index, _ in toolbox.current_families_dict.items():
+            family = toolbox.families_list[index]
+            raw_error_matrix_list.append(family.raw_error_matrix)
         best_raw_error_matrix = population[0].fam.raw_error_matrix
         dynamic_weights.update_dynamic_weights(toolbox.prev_best_raw_error_matrix, best_raw_error_matrix, \
             raw_error_matrix_list, toolbox.dynamic_weights_adaptation_speed)
         dynamic_weights.log_info(toolbox.f)
         toolbox.prev_best_raw_error_matrix = best_raw_error_matrix
-        for family in toolbox.families_list:
-            family.update_normalised_error()
-    # always sort!
-    population.sort(key=toolbox.sort_ind_key)
+        # the normalised errors of the families follow lazily, see Family.normalised_error
+    if not population_is_sorted or toolbox.dynamic_weights: # the dynamic weights change the order
+        population.sort(key=toolbox.sort_ind_key)
 
 
 def consistency_check_ind(toolbox, ind):
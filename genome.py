@@ -0,0 +1,52 @@
+'''The individuals of the GA.  Conversion from and to deap strings is at the edges only : Individual.from_string, str(ind)'''
+from deap import gp
+
+
+class Individual(gp.PrimitiveTree):
+    '''gp.PrimitiveTree with the administration of the GA in slots, instead of attributes in a __dict__ per individual :
+        fam : the Family, see ga_search_tools.Family
+        age, id : see ga_search_tools.copy_individual
+        code : the prefix encoded code, int32[len(ind), 3], see cpp_coupling.get_code
+        ends : the subtree ends, see get_subtree_ends
+    '''
+    __slots__ = ("fam", "age", "id", "code", "ends")
+
+    def searchSubtree(self, begin):
+        '''Same as gp.PrimitiveTree.searchSubtree, without scanning the tree'''
+        return slice(begin, get_subtree_ends(self)[begin])
+
+
+def compute_subtree_ends(ind):
+    '''Returns ends, with ind[i:ends[i]] the subtree at index i.  Same as searchSubtree for all i, in one pass'''
+    ends = [0] * len(ind)
+    stack = []
+    for i in range(len(ind) - 1, -1, -1):
+        end = i + 1
+        for _ in range(ind[i].arity):
+            end = stack.pop() # end of the last child
+        ends[i] = end
+        stack.append(end)
+    return ends
+
+
+def get_subtree_ends(ind):
+    '''The subtree ends of ind, computed once and kept in ind.ends.  Like the code, the ends are never changed in place,
+    so children can share them with their parents, see splice_subtree_ends'''
+    ends = getattr(ind, "ends", None)
+    if ends is None:
+        ends = compute_subtree_ends(ind)
+        if isinstance(ind, Individual):
+            ind.ends = ends
+    assert len(ends) == len(ind)
+    return ends
+
+
+def splice_subtree_ends(ends, slice_, source_ends, source_start):
+    '''Returns the subtree ends after the subtree at slice_ is replaced by a subtree with ends source_ends, that
+    started at index source_start in its own tree'''
+    start, stop = slice_.start, slice_.stop
+    delta = len(source_ends) - (stop - start)
+    # before start, only the ancestors of the replaced subtree end after start
+    return [end + delta if end > start else end for end in ends[:start]] + \
+        [end - source_start + start for end in source_ends] + \
+        [end + delta for end in ends[stop:]]
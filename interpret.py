@@ -1,124 +1,117 @@
 '''Interpreter for LISP like programming language'''
+import re
 import sys
-import copy # mandatory
 import time
 
 
+# single pass tokenizer : "(" and ")" are tokens, spaces, commas and quotes (DEAP stuff) separate tokens
+_token_regex = re.compile(r"[()]|[^ ,\"'()]+")
+
+
 class Parser:
-    ''''''
+    '''Recursive descent parser.  All parse state is in the Parser object, so use one Parser per program string;
+    compile and compile_deap create their own and can be used from several threads at the same time.'''
     _end_of_program = ""
-    _i = None
-    _peek_token = None
-    _token = None
-    _tokens = None
+
+    def __init__(self, program_str):
+        self._program_str = program_str
+        self._tokens = Parser._tokenize(program_str)
+        self._first_token()
 
     def _tokenize(line):
-        line = line.lower()
-        for deap_stuff in [",", '"', "'"]:
-            line = line.replace(deap_stuff, " ")
-        for sep in ["(", ")", ","]:
-            line = line.replace(sep, " " + sep + " ")
-        return [token for token in line.split(" ") if token != '']
-
-    def _first_token():
-        if len(Parser._tokens) > 0:
-            Parser._i = 0
-            Parser._token = Parser._tokens[Parser._i]
-            Parser._peek_token = Parser._tokens[Parser._i + 1] if Parser._i + 1 < len(Parser._tokens) else Parser._end_of_program
-        else:
-            Parser._token = Parser._end_of_program
-            Parser._peek_token = Parser._end_of_program
-
-    def _next_token():
-        if len(Parser._tokens) > Parser._i + 1:
-            Parser._i += 1
-            Parser._token = Parser._tokens[Parser._i]
-            Parser._peek_token = Parser._tokens[Parser._i + 1] if Parser._i + 1 < len(Parser._tokens) else Parser._end_of_program
+        return _token_regex.findall(line.lower())
+
+    def _first_token(self):
+        self._i = 0
+        self._token = self._tokens[0] if len(self._tokens) > 0 else Parser._end_of_program
+        self._peek_token = self._tokens[1] if len(self._tokens) > 1 else Parser._end_of_program
+
+    def _next_token(self):
+        if len(self._tokens) > self._i + 1:
+            self._i += 1
+            self._token = self._tokens[self._i]
+            self._peek_token = self._tokens[self._i + 1] if self._i + 1 < len(self._tokens) else Parser._end_of_program
         else:
-            Parser._token = Parser._end_of_program
-            Parser._peek_token = Parser._end_of_program
+            self._token = Parser._end_of_program
+            self._peek_token = Parser._end_of_program
 
     def _token_to_str(token):
         return token if token != Parser._end_of_program else "end-of-program"
 
-    def _raise_error(msg2):
+    def _raise_error(self, msg2):
         msg1 = ""
-        for i in range(len(Parser._tokens)):
-            if i == Parser._i:
-                msg1 += ">>" + Parser._tokens[i] + "<< "
+        for i in range(len(self._tokens)):
+            if i == self._i:
+                msg1 += ">>" + self._tokens[i] + "<< "
             else:
-                msg1 += Parser._tokens[i] + " "
+                msg1 += self._tokens[i] + " "
         raise RuntimeError(msg1 + "\n              " + msg2)
 
-    def _expect_token(expected):
-        if Parser._token != expected:
-            Parser._raise_error(f"'{Parser._token_to_str(expected)}' expected")
-        Parser._next_token()
-
-    def _parse_element():
-        if Parser._token.isnumeric(): # positive integral number
-            result = int(Parser._token)
-            Parser._next_token()
-        elif Parser._token == "-" and Parser._peek_token.isnumeric(): # negative integral number
-            Parser._next_token()
-            result = -int(Parser._token)
-            Parser._next_token()
-        elif Parser._token.isidentifier(): # identifier, but also "setq", "for1",
-            result = Parser._token
-            Parser._next_token()
-        elif Parser._token == "(": # list
-            Parser._next_token()
+    def _expect_token(self, expected):
+        if self._token != expected:
+            self._raise_error(f"'{Parser._token_to_str(expected)}' expected")
+        self._next_token()
+
+    def _parse_element(self):
+        if self._token.isnumeric(): # positive integral number
+            result = int(self._token)
+            self._next_token()
+        elif self._token == "-" and self._peek_token.isnumeric(): # negative integral number
+            self._next_token()
+            result = -int(self._token)
+            self._next_token()
+        elif self._token.isidentifier(): # identifier, but also "setq", "for1",
+            result = self._token
+            self._next_token()
+        elif self._token == "(": # list
+            self._next_token()
             result = []
-            while Parser._token != ")":
-                result.append(Parser._parse_element())
-            Parser._next_token()
+            while self._token != ")":
+                result.append(self._parse_element())
+            self._next_token()
         else:
-            raise RuntimeError(f"atom or list expected instead of '{Parser._token_to_str(Parser._token)}'")
+            raise RuntimeError(f"atom or list expected instead of '{Parser._token_to_str(self._token)}'")
         return result
 
-    def compile(program_str):
-        Parser._tokens = Parser._tokenize(program_str)
-        Parser._first_token()
-        program = Parser._parse_element()
-        Parser._expect_token(Parser._end_of_program)
+    def compile(self):
+        program = self._parse_element()
+        self._expect_token(Parser._end_of_program)
         return program
 
-    def _parse_deap_element(functions):
-        # print("DEBUG 84 : _parse_deap_element start", Parser._token)
-        if Parser._token.isnumeric(): # positive integral number
-            result = int(Parser._token)
-            Parser._next_token()
-        elif Parser._token == "-" and Parser._peek_token.isnumeric(): # negative integral number
-            Parser._next_token()
-            result = -int(Parser._token)
-            Parser._next_token()
-        elif Parser._token in get_build_in_functions() or Parser._token in functions:
-            # print("DEBU 95: buildin", Parser._token)
+    def _parse_deap_element(self, functions):
+        # print("DEBUG 84 : _parse_deap_element start", self._token)
+        if self._token.isnumeric(): # positive integral number
+            result = int(self._token)
+            self._next_token()
+        elif self._token == "-" and self._peek_token.isnumeric(): # negative integral number
+            self._next_token()
+            result = -int(self._token)
+            self._next_token()
+        elif self._token in build_in_functions_set or self._token in functions:
+            # print("DEBU 95: buildin", self._token)
             # formula(arg1, ...argn)
-            result = [Parser._token]
-            Parser._next_token()
-            Parser._expect_token("(")
-            while Parser._token != ")":
-                result.append(Parser._parse_deap_element(functions))
-            Parser._next_token()
-        elif Parser._token.isidentifier(): # identifier
-            # print("DEBU 104: identifier", Parser._token)
-            result = Parser._token
-            Parser._next_token()
+            result = [self._token]
+            self._next_token()
+            self._expect_token("(")
+            while self._token != ")":
+                result.append(self._parse_deap_element(functions))
+            self._next_token()
+        elif self._token.isidentifier(): # identifier
+            # print("DEBU 104: identifier", self._token)
+            result = self._token
+            self._next_token()
         else:
-            Parser._raise_error(f"number, function or identifyer expected")
+            self._raise_error(f"number, function or identifyer expected")
         return result
 
-    def compile_deap(program_str, functions):
+    def compile_deap(self, functions):
         try:
-            Parser._tokens = Parser._tokenize(program_str)
-            Parser._first_token()
-            program = Parser._parse_deap_element(functions)
-            Parser._expect_token(Parser._end_of_program)
+            program = self._parse_deap_element(functions)
+            self._expect_token(Parser._end_of_program)
             return program
         except RuntimeError as e:
             print("Runtimeerror", str(e))
-            print("compile_deap(", program_str, ")")
+            print("compile_deap(", self._program_str, ")")
             raise e
 
 
@@ -131,16 +124,34 @@ global count_runs_calls
 count_runs_calls = 0
 
 
-def check_depth_impl(data):
+# The interpreter never modifies a list in place, so the number of items of a list is fixed once it is built
+global data_size_cache
+data_size_cache = dict() # data_size_cache[id(data)] = (data, count_items), the data is kept alive to keep its id unique
+
+
+def get_data_size(data):
+    '''Number of items in data.  Only the sublists of which the size is not yet known are visited'''
+    if type(data) != type([]):
+        return 1
+    entry = data_size_cache.get(id(data))
+    if entry is not None:
+        return entry[1]
     count_items = 1
-    if type(data) == type([]):
-        for item in data:
-            count_items += check_depth_impl(item)
+    for item in data:
+        count_items += get_data_size(item)
+    data_size_cache[id(data)] = (data, count_items)
     return count_items
 
 
+def set_data_size(data, count_items):
+    '''For a list that is just built, count_items computed from the sizes of its parts'''
+    if count_items > 1000:
+        raise RuntimeError("data size exceeded")
+    data_size_cache[id(data)] = (data, count_items)
+
+
 def check_depth(data, current_depth):
-    count_items = check_depth_impl(data)
+    count_items = get_data_size(data)
     if count_items > 1000:
         raise RuntimeError("data size exceeded")
     return count_items
@@ -236,20 +247,14 @@ def _run(program, variables, functions, debug, depth):
                 if i == 0:
                     result = value
                 else:
-                    result += value
+                    result = result + value # not +=, values are never modified in place
         elif program[0] == "append":
             result = 0
             values = []
             for i in range(1, len(program)):
                 values.append(_run(program[i], variables, functions, debug, depth+1)) # NO LAZY EVALUATION!
-            for i, value in enumerate(values):
-                if i == 0:
-                    if type(value) != type([]):
-                        result = 0
-                        break
-                    result = value
-                else:
-                    result.append(value)
+            if len(values) > 0 and type(values[0]) == type([]):
+                result = values[0] + values[1:] # not .append, values are never modified in place
         elif program[0] == "cons": # (cons 1 (2 3)) == (1 2 3); (car (1 2 3)) == 1; (cdr (1 2 3)) == (2 3)
             if len(program) < 2:
                 result = 0
@@ -323,7 +328,7 @@ def _run(program, variables, functions, debug, depth):
                 result = _run(program[2], variables, functions, debug, depth+1)
                 check_depth(result, 0)
                 if type(local_variable) == type(""):
-                    variables[local_variable] = copy.deepcopy(result)
+                    variables[local_variable] = result
         elif program[0] == "function":
             result = 0
             if len(program) >= 4:
@@ -404,10 +409,10 @@ def _run(program, variables, functions, debug, depth):
             result = 0
     elif type(program) == type(""):
         identifyer = program
-        # NOTE : the copy.deepcopy is mandatory here to prevent self-referential loops with
-        # (var n (1) (extend n (n))
-
-        result = copy.deepcopy(variables[identifyer]) if identifyer in variables else 0
+        # NOTE : no copy is needed here : the interpreter never modifies a list in place (extend and append build
+        # a new list), so values can be shared between variables, and (var n (1) (extend n (n)) can't create
+        # a self-referential loop
+        result = variables[identifyer] if identifyer in variables else 0
     elif type(program) == type(1):
         result = program if abs(program) < 1000000000 else 0
     else:
@@ -418,6 +423,514 @@ def _run(program, variables, functions, debug, depth):
     return result
 
 
+# ====================== compiler to closures ======================================
+
+
+# _compile_node turns a program into a tree of closures node(variables, functions, depth), with exactly the same
+# semantics and limits as _run.  The dispatch on program[0] is done once, at compile time.
+# Only the user functions are looked up at run time, because "function" may (re)define them while running.
+
+
+global compiled_cache
+compiled_cache = dict() # compiled_cache[id(program)] = (program, node), the program is kept alive to keep its id unique
+max_compiled_cache_size = 10000
+
+
+def _get_compiled(program):
+    global compiled_cache
+    entry = compiled_cache.get(id(program))
+    if entry is not None and entry[0] is program:
+        return entry[1]
+    if len(compiled_cache) >= max_compiled_cache_size:
+        compiled_cache = dict()
+    node = _compile_node(program)
+    compiled_cache[id(program)] = (program, node)
+    return node
+
+
+def _enter(depth):
+    if depth > 100:
+        raise RuntimeError("code depth exceeded")
+    global count_runs_calls
+    count_runs_calls += 1
+    if count_runs_calls > 10000:
+        raise RuntimeError("code run calls exceeded")
+
+
+def _sum_data_sizes(values):
+    count_items = 0
+    for value in values:
+        count_items += get_data_size(value)
+    return count_items
+
+
+def _check_not_none(result, program):
+    if result is None:
+        print("WARNING: program", program, "has result None, which is unexpected")
+        result = 0
+    return result
+
+
+def _mul(a, b):
+    result = a * b
+    return result if result <= 1000000000 else 0
+
+
+_numeric_operators = {
+    "lt": lambda a, b: 1 if a < b else 0,
+    "le": lambda a, b: 1 if a <= b else 0,
+    "ge": lambda a, b: 1 if a >= b else 0,
+    "gt": lambda a, b: 1 if a > b else 0,
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "mul": _mul,
+    "div": lambda a, b: a // b if b != 0 else 0,
+}
+
+
+def _compile_identifier(identifyer):
+    def node(variables, functions, depth):
+        _enter(depth)
+        # NOTE : no copy is needed here, see _run
+        result = variables[identifyer] if identifyer in variables else 0
+        check_depth(result, 0)
+        return result
+    return node
+
+
+def _compile_constant(value):
+    def node(variables, functions, depth):
+        _enter(depth)
+        return value
+    return node
+
+
+def _compile_error(program):
+    def node(variables, functions, depth):
+        _enter(depth)
+        raise RuntimeError(f"list, identifyer or int expected instead of '{program}'")
+    return node
+
+
+def _compile_numeric(program, operands):
+    operator = _numeric_operators[program[0]]
+    a_node = operands[0] if len(operands) > 0 else None
+    b_node = operands[1] if len(operands) > 1 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        a = a_node(variables, functions, depth+1) if a_node is not None else 0
+        b = b_node(variables, functions, depth+1) if b_node is not None else 0
+        if type(a) != type(1) or type(b) != type(1):
+            return 0
+        return operator(a, b)
+    return node
+
+
+def _compile_equality(program, operands):
+    is_eq = program[0] == "eq"
+    a_node = operands[0] if len(operands) > 0 else None
+    b_node = operands[1] if len(operands) > 1 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        a = a_node(variables, functions, depth+1) if a_node is not None else 0
+        b = b_node(variables, functions, depth+1) if b_node is not None else 0
+        return 1 if (a == b) == is_eq else 0
+    return node
+
+
+def _compile_and(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        for operand in operands:
+            result = 1 if operand(variables, functions, depth+1) else 0
+            if not result:
+                break
+        return result
+    return node
+
+
+def _compile_or(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        for operand in operands:
+            result = 1 if operand(variables, functions, depth+1) else 0
+            if result:
+                break
+        return result
+    return node
+
+
+def _compile_not(program, operands):
+    x_node = operands[0] if len(operands) > 0 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        if x_node is None:
+            return 0
+        return 0 if x_node(variables, functions, depth+1) else 1
+    return node
+
+
+def _compile_first(program, operands):
+    x_node = operands[0] if len(operands) > 0 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if x_node is not None:
+            x = x_node(variables, functions, depth+1)
+            result = _check_not_none(x[0], program) if type(x) == type([]) and len(x) > 0 else 0
+        return result
+    return node
+
+
+def _compile_rest(program, operands):
+    x_node = operands[0] if len(operands) > 0 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if x_node is not None:
+            x = x_node(variables, functions, depth+1)
+            if type(x) == type([]):
+                result = x[1:]
+                set_data_size(result, get_data_size(x) - get_data_size(x[0]) if len(x) > 0 else 1)
+        return result
+    return node
+
+
+def _compile_extend(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        values = [operand(variables, functions, depth+1) for operand in operands] # NO LAZY EVALUATION!
+        for i, value in enumerate(values):
+            if type(value) != type([]):
+                result = 0
+                break
+            if i == 0:
+                result = value
+            else:
+                result = result + value # not +=, values are never modified in place
+        if type(result) == type([]) and len(values) > 1:
+            set_data_size(result, 1 + _sum_data_sizes(values) - len(values))
+        return result
+    return node
+
+
+def _compile_append(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        values = [operand(variables, functions, depth+1) for operand in operands] # NO LAZY EVALUATION!
+        if len(values) > 0 and type(values[0]) == type([]):
+            result = values[0] + values[1:] # not .append, values are never modified in place
+            set_data_size(result, _sum_data_sizes(values))
+        return result
+    return node
+
+
+def _compile_cons(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        if len(operands) == 0:
+            return 0
+        values = [operand(variables, functions, depth+1) for operand in operands] # NO LAZY EVALUATION!
+        result = [values[0]]
+        for value in values[1:]:
+            if type(value) != type([]):
+                result = 0
+                break
+            result.extend(value)
+        if type(result) == type([]):
+            set_data_size(result, 1 + _sum_data_sizes(values) - (len(values) - 1))
+        return result
+    return node
+
+
+def _compile_len(program, operands):
+    x_node = operands[0] if len(operands) > 0 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if x_node is not None:
+            x = x_node(variables, functions, depth+1)
+            if type(x) == type([]):
+                result = len(x)
+        return result
+    return node
+
+
+def _compile_at(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if len(operands) > 1:
+            x = operands[0](variables, functions, depth+1)
+            for index_node in operands[1:]:
+                if type(x) != type([]):
+                    result = 0
+                    break
+                index = index_node(variables, functions, depth+1)
+                if type(index) != type(1):
+                    result = 0
+                    break
+                if index >= len(x) or index < 0:
+                    result = 0
+                    break
+                x = x[index]
+                result = x
+        result = _check_not_none(result, program)
+        return result
+    return node
+
+
+def _compile_list(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = [operand(variables, functions, depth+1) for operand in operands]
+        set_data_size(result, 1 + _sum_data_sizes(result))
+        return result
+    return node
+
+
+def _compile_last(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        for operand in operands:
+            result = operand(variables, functions, depth+1)
+        result = _check_not_none(result, program)
+        return result
+    return node
+
+
+def _compile_var(program, operands):
+    local_variable = program[1] if len(program) > 1 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        if len(operands) < 3:
+            return 0
+        if type(local_variable) == type(""):
+            expr = operands[1](variables, functions, depth+1)
+            if local_variable in variables:
+                old_value = variables[local_variable]
+            else:
+                old_value = None
+            variables[local_variable] = expr
+            result = operands[2](variables, functions, depth+1)
+            if old_value is not None:
+                variables[local_variable] = old_value
+            else:
+                del variables[local_variable]
+        else:
+            result = operands[2](variables, functions, depth+1)
+        result = _check_not_none(result, program)
+        return result
+    return node
+
+
+def _compile_assign(program, operands):
+    local_variable = program[1] if len(program) > 1 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if len(operands) == 2:
+            result = operands[1](variables, functions, depth+1)
+            if type(local_variable) == type(""):
+                variables[local_variable] = result
+        return result
+    return node
+
+
+def _compile_function(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if len(program) >= 4:
+            function_name = program[1]
+            if type(function_name) == type(""):
+                result = (program[2], program[3])
+                functions[function_name] = result
+        return result
+    return node
+
+
+def _compile_call(program, operands):
+    function_name = program[0]
+    def node(variables, functions, depth):
+        _enter(depth)
+        formal_params, code = functions[function_name]
+        actual_params = [operand(variables, functions, depth+1) for operand in operands]
+        new_scope = bind_params(formal_params, actual_params)
+        result = _get_compiled(code)(new_scope, functions, depth+1)
+        result = _check_not_none(result, program)
+        return result
+    return node
+
+
+def _compile_if(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if len(operands) >= 2:
+            condition = operands[0](variables, functions, depth+1)
+            if condition:
+                result = operands[1](variables, functions, depth+1)
+            elif len(operands) >= 3:
+                result = operands[2](variables, functions, depth+1)
+            else:
+                result = 0
+        result = _check_not_none(result, program)
+        return result
+    return node
+
+
+def _compile_for(program, operands):
+    loop_variable = program[1] if len(program) > 1 else None
+    def node(variables, functions, depth):
+        _enter(depth)
+        if len(operands) < 3:
+            return []
+        steps = operands[1](variables, functions, depth+1)
+        if type(steps) == type(1):
+            if steps > 1000:
+                raise RuntimeError("for loop max iterations exceeded")
+            steps = [i for i in range(steps)]
+        result = []
+        if type(loop_variable) == type("") and loop_variable in variables:
+            old_value = variables[loop_variable]
+            variables[loop_variable] = 0 # make sure the old value cannot be accessed anymore
+        else:
+            old_value = None
+        for i in steps:
+            if type(loop_variable) == type(""):
+                variables[loop_variable] = i
+            result.append(operands[2](variables, functions, depth+1))
+        if type(loop_variable) == type(""):
+            if old_value is not None:
+                variables[loop_variable] = old_value
+            else:
+                variables[loop_variable] = 0 # identical effect to value of unknown variable
+        set_data_size(result, 1 + _sum_data_sizes(result))
+        return result
+    return node
+
+
+def _compile_print(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        for p, operand in zip(program[1:], operands):
+            result = operand(variables, functions, depth+1)
+            print(str(p), "=", str(result))
+        result = _check_not_none(result, program)
+        return result
+    return node
+
+
+def _compile_assert(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if len(operands) > 0:
+            value = operands[0](variables, functions, depth+1)
+            if not value:
+                raise RuntimeError(f"assertion failed : {str(program)}")
+            result = 1
+        return result
+    return node
+
+
+def _compile_exit(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        exit()
+    return node
+
+
+def _compile_sum(program, operands):
+    def node(variables, functions, depth):
+        _enter(depth)
+        result = 0
+        if len(operands) > 0:
+            values = operands[0](variables, functions, depth+1)
+            if type(values) == type([]):
+                for v in values:
+                    if type(v) != type(1):
+                        result = 0
+                        break
+                    result += v
+        return result
+    return node
+
+
+def _compile_data(program, operands):
+    # a list that doesn't start with a build in function, e.g. (1 2 3).  operands includes program[0]
+    head = program[0]
+    def node(variables, functions, depth):
+        _enter(depth)
+        if type(head) == type("") and head not in variables and head not in functions:
+            print(f"Warning: list starts with non-function {str(head)}")
+        result = [operand(variables, functions, depth+1) for operand in operands]
+        set_data_size(result, 1 + _sum_data_sizes(result))
+        return result
+    return node
+
+
+def _compile_overridable(program, operands, compile_build_in):
+    # In _run, the user functions are checked after "function" and before "if", "for", ... "sum" and data lists
+    function_name = program[0]
+    call_node = _compile_call(program, operands[1:] if compile_build_in == _compile_data else operands)
+    build_in_node = compile_build_in(program, operands)
+    def node(variables, functions, depth):
+        if function_name in functions:
+            return call_node(variables, functions, depth)
+        return build_in_node(variables, functions, depth)
+    return node
+
+
+_build_in_compilers = {
+    "lt": _compile_numeric, "le": _compile_numeric, "ge": _compile_numeric, "gt": _compile_numeric,
+    "add": _compile_numeric, "sub": _compile_numeric, "mul": _compile_numeric, "div": _compile_numeric,
+    "eq": _compile_equality, "ne": _compile_equality,
+    "and": _compile_and, "or": _compile_or, "not": _compile_not,
+    "first": _compile_first, "rest": _compile_rest,
+    "extend": _compile_extend, "append": _compile_append, "cons": _compile_cons, "len": _compile_len,
+    "at": _compile_at, "at1": _compile_at, "at2": _compile_at, "at3": _compile_at,
+    "list": _compile_list, "list1": _compile_list, "list2": _compile_list, "list3": _compile_list,
+    "last": _compile_last, "last1": _compile_last, "last2": _compile_last, "last3": _compile_last,
+    "var": _compile_var, "assign": _compile_assign, "function": _compile_function,
+}
+
+
+_overridable_build_in_compilers = {
+    "if": _compile_if, "if_then_else": _compile_if, "for": _compile_for,
+    "print": _compile_print, "assert": _compile_assert, "exit": _compile_exit, "sum": _compile_sum,
+}
+
+
+def _compile_node(program):
+    if type(program) == type([]):
+        if len(program) == 0:
+            return _compile_list(program, [])
+        head = program[0]
+        if type(head) != type(""):
+            return _compile_data(program, [_compile_node(p) for p in program])
+        if head == "function":
+            return _compile_function(program, []) # the code of the function is compiled when it is called
+        if head in _build_in_compilers:
+            return _build_in_compilers[head](program, [_compile_node(p) for p in program[1:]])
+        if head in _overridable_build_in_compilers:
+            return _compile_overridable(program, [_compile_node(p) for p in program[1:]], _overridable_build_in_compilers[head])
+        return _compile_overridable(program, [_compile_node(p) for p in program], _compile_data)
+    elif type(program) == type(""):
+        return _compile_identifier(program)
+    elif type(program) == type(1):
+        return _compile_constant(program if abs(program) < 1000000000 else 0)
+    else:
+        return _compile_error(program)
+
+
 # ============================================== INTERFACE ====================
 
 
@@ -437,18 +950,62 @@ def load(file_name):
     return program_str
 
 
+def _load_tokens(file_name):
+    '''Yields the tokens of the file one line at a time, with the same comment handling as load'''
+    with open(file_name, "r") as f:
+        for line in f:
+            parts = []
+            for part in line.strip().lower().split(" "):
+                if len(part) > 0:
+                    if part[0] == '#':
+                        break
+                    parts.append(part)
+            yield from Parser._tokenize(" ".join(parts))
+
+
+def compile_list_elements(file_name):
+    '''Yields the compiled elements of the list in file_name, one at a time.  Same elements as compile(load(file_name)),
+    but only one element is in memory at a time.'''
+    tokens = _load_tokens(file_name)
+    if next(tokens, Parser._end_of_program) != "(":
+        raise RuntimeError(f"{file_name}: '(' expected")
+    element = []
+    depth = 0
+    for token in tokens:
+        if depth == 0 and token == ")":
+            break
+        element.append(token)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        if depth == 0 and token != "-": # "-" is followed by the digits of a negative number
+            yield Parser(" ".join(element)).compile()
+            element = []
+    else:
+        raise RuntimeError(f"{file_name}: ')' expected")
+    if len(element) > 0:
+        yield Parser(" ".join(element)).compile() # raises the error of the incomplete element
+    if next(tokens, Parser._end_of_program) != Parser._end_of_program:
+        raise RuntimeError(f"{file_name}: 'end-of-program' expected")
+
+
 def compile(program_str):
     '''Compiles program_str'''
-    return Parser.compile(program_str)
+    return Parser(program_str).compile()
 
 
 def run(program, variables, functions, debug=False):
     '''Runs compiled program'''
     #print("run start")
-    global count_runs_calls
+    global count_runs_calls, data_size_cache
     count_runs_calls = 0
+    data_size_cache = dict()
     try:
-        result = _run(program, variables, functions, debug, 0)
+        if debug:
+            result = _run(program, variables, functions, debug, 0)
+        else:
+            result = _get_compiled(program)(variables, functions, 0)
         #if len(program) < 40:
         #    print("DEBUG interpret.py, 448", program, functions, result)
     except RuntimeError as e:
@@ -461,6 +1018,8 @@ def run(program, variables, functions, debug=False):
         print(convert_code_to_str(program))
         print("MemoryError", str(e))
         return 0
+    finally:
+        data_size_cache = dict() # release the data of this run
     #print("run end")
     return result
 
@@ -507,6 +1066,9 @@ def get_build_in_functions():
         ]
 
 
+build_in_functions_set = frozenset(get_build_in_functions())
+
+
 def get_build_in_function_param_types(fname):
     # return a list with type-indication of the params of the build-in function.
     # type-indications : 1=numeric; "*"=zero or more numeric; "?"=0 or 1 numeric; "v"=variable; []=list
@@ -586,7 +1148,7 @@ def write_functions(filename, functions, mode="w"):
 
 def compile_deap(program_str, functions):
     '''Compiles DEAP program_str into an LISP program'''
-    program = Parser.compile_deap(program_str, functions)
+    program = Parser(program_str).compile_deap(functions)
     return program
 
 
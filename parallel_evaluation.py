@@ -0,0 +1,65 @@
+'''Evaluation of batches of individuals on a pool of worker processes, each with its own cpp_handle'''
+import multiprocessing
+
+import cpp_coupling
+
+
+global g_cpp_handle, g_penalise_non_reacting_models, g_family_key_is_error_matrix
+g_cpp_handle = None
+g_penalise_non_reacting_models = False
+g_family_key_is_error_matrix = False
+
+
+def init_worker(example_inputs, formal_params, local_variable_names, expected_outputs, penalise_non_reacting_models, family_key_is_error_matrix, \
+        subtree_value_cache_size, error_weights, native_evaluator):
+    '''Runs once in every worker process'''
+    global g_cpp_handle, g_penalise_non_reacting_models, g_family_key_is_error_matrix
+    g_cpp_handle = cpp_coupling.get_cpp_handle(example_inputs, formal_params, local_variable_names, expected_outputs)
+    cpp_coupling.set_subtree_value_cache_size(g_cpp_handle, subtree_value_cache_size)
+    cpp_coupling.set_error_weights(g_cpp_handle, error_weights)
+    cpp_coupling.set_native_evaluator(g_cpp_handle, native_evaluator)
+    # a pp_str contains the DEAP names of the arguments, ARG0, ARG1, ..., instead of the renamed arguments
+    symbol_table = g_cpp_handle[2]
+    for i, _ in enumerate(formal_params + local_variable_names):
+        symbol_table[f"ARG{i}"] = i
+    g_penalise_non_reacting_models = penalise_non_reacting_models
+    g_family_key_is_error_matrix = family_key_is_error_matrix
+
+
+def evaluate_pp_strs(pp_strs):
+    '''Runs in a worker process.  Returns (raw_error_matrix, family_key) for each pp_str'''
+    global g_cpp_handle, g_penalise_non_reacting_models, g_family_key_is_error_matrix
+    deap_codes = [pp_str.split(" ") for pp_str in pp_strs]
+    raw_error_matrices, _, family_keys = cpp_coupling.compute_error_matrices(g_cpp_handle, deap_codes, g_penalise_non_reacting_models, \
+        get_item_value=cpp_coupling.get_pp_str_item_value)
+    result = []
+    for raw_error_matrix, keys in zip(raw_error_matrices, family_keys):
+        result.append((raw_error_matrix, cpp_coupling.select_family_key(raw_error_matrix, keys, g_family_key_is_error_matrix)))
+    return result
+
+
+# ======================================== interface ================================================
+
+
+def create_pool(toolbox):
+    if toolbox.parallel_workers <= 0:
+        return None
+    initargs = (toolbox.example_inputs, toolbox.formal_params, toolbox.var_hints, toolbox.expected_outputs, \
+        toolbox.penalise_non_reacting_models, toolbox.family_key_is_error_matrix, toolbox.subtree_value_cache_size, \
+        toolbox.error_weights, toolbox.native_evaluator)
+    return multiprocessing.Pool(toolbox.parallel_workers, initializer=init_worker, initargs=initargs)
+
+
+def close_pool(pool):
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def evaluate_pp_strs_in_parallel(pool, pp_strs, batch_size):
+    '''Returns (raw_error_matrix, family_key) for each pp_str, in the order of pp_strs'''
+    batches = [pp_strs[i:i+batch_size] for i in range(0, len(pp_strs), batch_size)]
+    result = []
+    for batch_result in pool.map(evaluate_pp_strs, batches):
+        result.extend(batch_result)
+    return result